@@ -0,0 +1,196 @@
+# adherence.py
+# Vectorized adherence analytics over the dose logs.
+# Log events are folded into a (user/med pair x day x [taken, missed, late]) count
+# cube. refresh() only reads log rows above the last seen id (the watermark) and
+# adds them with np.add.at; 7/30/90-day windows are slice sums over the cube.
+#
+# "late" = a Taken logged more than LATE_AFTER_S after the last REMINDER for the
+# same user and med.
+import sqlite3, threading, time
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = (7, 30, 90)
+KEEP_DAYS = max(WINDOWS)
+LATE_AFTER_S = 30 * 60
+DAY_S = 86400
+TAKEN, MISSED, LATE = 0, 1, 2
+STATUS_CODES = {"Taken": TAKEN, "Missed": MISSED, "REMINDER": -1}
+
+
+def mark_late(pair: np.ndarray, ts: np.ndarray, status: np.ndarray,
+              last_reminder: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Late flags for Taken events, plus each pair's updated last-reminder time.
+
+    Events are processed in (pair, ts) order; `last_reminder` holds, per pair, the
+    last reminder seen in earlier batches (-inf if none)."""
+    order = np.lexsort((ts, pair))
+    p, t, s = pair[order], ts[order], status[order]
+    n = len(p)
+    # each event's most recent reminder at or before it within the same pair:
+    # carry forward the index of the last reminder, then reject matches from another pair
+    is_rem = s == -1
+    idx = np.where(is_rem, np.arange(n), -1)
+    last_idx = np.maximum.accumulate(idx) if n else idx
+    same = (last_idx >= 0) & (p[np.maximum(last_idx, 0)] == p)
+    rem_ts = np.where(same, t[np.maximum(last_idx, 0)], last_reminder[p])
+    late_sorted = (s == TAKEN) & np.isfinite(rem_ts) & (t - rem_ts > LATE_AFTER_S)
+    late = np.empty(n, dtype=bool)
+    late[order] = late_sorted
+    updated = last_reminder.copy()
+    if is_rem.any():
+        # sorted by (pair, ts): the last write per pair wins
+        updated[p[is_rem]] = t[is_rem]
+    return late, updated
+
+
+class AdherenceEngine:
+    def __init__(self):
+        self._lock = threading.Lock()            # guards the arrays below
+        self._refresh_lock = threading.Lock()    # one refresh at a time: watermark read -> ingest -> update
+        self._pairs: Dict[Tuple[int, int], int] = {}
+        self.pair_user = np.zeros(0, dtype=np.int64)
+        self.pair_med = np.zeros(0, dtype=np.int64)
+        self.last_reminder = np.zeros(0, dtype=np.float64)
+        self.day0: Optional[int] = None                      # epoch day of counts[:, 0]
+        self.counts = np.zeros((0, 0, 3), dtype=np.int32)
+        self.watermarks: Dict[int, int] = {}                  # source index -> last log id
+
+    # ---------- ingestion ----------
+    def _pair_ids(self, users: np.ndarray, meds: np.ndarray) -> np.ndarray:
+        ids = np.empty(len(users), dtype=np.int64)
+        new_u, new_m = [], []
+        for i, key in enumerate(zip(users.tolist(), meds.tolist())):
+            pid = self._pairs.get(key)
+            if pid is None:
+                pid = self._pairs[key] = len(self._pairs)
+                new_u.append(key[0])
+                new_m.append(key[1])
+            ids[i] = pid
+        if new_u:
+            self.pair_user = np.concatenate([self.pair_user, new_u])
+            self.pair_med = np.concatenate([self.pair_med, new_m])
+            self.last_reminder = np.concatenate([self.last_reminder, np.full(len(new_u), -np.inf)])
+            self.counts = np.concatenate(
+                [self.counts, np.zeros((len(new_u), self.counts.shape[1], 3), dtype=np.int32)])
+        return ids
+
+    def _ensure_days(self, first_day: int, last_day: int):
+        if self.day0 is None:
+            self.day0 = first_day
+        lo = min(self.day0, first_day)
+        hi = max(self.day0 + self.counts.shape[1] - 1, last_day)
+        lo = max(lo, hi - KEEP_DAYS)   # nothing older than the largest window is ever needed
+        if lo == self.day0 and hi - lo + 1 == self.counts.shape[1]:
+            return
+        cube = np.zeros((self.counts.shape[0], hi - lo + 1, 3), dtype=np.int32)
+        src_lo, src_hi = max(lo, self.day0), min(hi, self.day0 + self.counts.shape[1] - 1)
+        if src_hi >= src_lo:
+            cube[:, src_lo - lo:src_hi - lo + 1] = self.counts[:, src_lo - self.day0:src_hi - self.day0 + 1]
+        self.counts, self.day0 = cube, lo
+
+    def ingest(self, users, meds, statuses, ts_text):
+        """Add a batch of log events (parallel sequences; ts as SQLite 'YYYY-MM-DD HH:MM:SS')."""
+        status = np.array([STATUS_CODES.get(s, -2) for s in statuses], dtype=np.int8)
+        keep = (status >= -1) & np.array([m is not None and u is not None for u, m in zip(users, meds)], dtype=bool)
+        if not keep.any():
+            return
+        users = np.asarray(users, dtype=object)[keep].astype(np.int64)
+        meds = np.asarray(meds, dtype=object)[keep].astype(np.int64)
+        status = status[keep]
+        ts = np.array(np.asarray(ts_text, dtype=object)[keep].tolist(), dtype="datetime64[s]").astype(np.int64)
+        with self._lock:
+            pair = self._pair_ids(users, meds)
+            late, self.last_reminder = mark_late(pair, ts.astype(np.float64), status, self.last_reminder)
+            day = ts // DAY_S
+            self._ensure_days(int(day.min()), int(day.max()))
+            d = day - self.day0
+            ok = d >= 0                       # events older than the kept range are dropped
+            dose = ok & (status >= 0)
+            np.add.at(self.counts, (pair[dose], d[dose], status[dose]), 1)
+            lt = ok & late
+            np.add.at(self.counts, (pair[lt], d[lt], LATE), 1)
+
+    def refresh(self, conns: Sequence[sqlite3.Connection], batch_rows: int = 50000) -> int:
+        """Read log rows past each source's watermark; returns how many were ingested.
+        Concurrent callers queue up, so the same rows are never ingested twice."""
+        total = 0
+        with self._refresh_lock:
+            for k, conn in enumerate(conns):
+                with closing(conn.cursor()) as c:
+                    c.execute("SELECT id, user_id, med_id, status, ts FROM logs WHERE id > ? ORDER BY id",
+                              (self.watermarks.get(k, 0),))
+                    while True:
+                        rows = c.fetchmany(batch_rows)
+                        if not rows:
+                            break
+                        ids, users, meds, statuses, ts = zip(*rows)
+                        self.ingest(users, meds, statuses, ts)
+                        self.watermarks[k] = ids[-1]
+                        total += len(rows)
+        return total
+
+    # ---------- queries ----------
+    def window_counts(self, days: int, now: Optional[float] = None) -> np.ndarray:
+        """(n_pairs, 3) counts of taken/missed/late over the last `days` days (today included)."""
+        with self._lock:
+            return self._window_counts(days, now)
+
+    def _window_counts(self, days: int, now: Optional[float]) -> np.ndarray:
+        # caller holds the lock
+        if self.day0 is None:
+            return np.zeros((len(self.pair_user), 3), dtype=np.int64)
+        today = int((now or time.time()) // DAY_S) - self.day0
+        lo, hi = max(0, today - days + 1), min(self.counts.shape[1], today + 1)
+        if hi <= lo:
+            return np.zeros((self.counts.shape[0], 3), dtype=np.int64)
+        return self.counts[:, lo:hi].sum(axis=1, dtype=np.int64)
+
+    def _snapshot(self, windows: Sequence[int], now: Optional[float]):
+        """(pair_user, pair_med, [counts per window]) taken together, so a concurrent
+        ingest can't add pairs between the id columns and the counts."""
+        with self._lock:
+            return self.pair_user, self.pair_med, [self._window_counts(w, now) for w in windows]
+
+    def per_med(self, windows: Sequence[int] = WINDOWS, now: Optional[float] = None) -> pd.DataFrame:
+        pair_user, pair_med, counts = self._snapshot(windows, now)
+        df = pd.DataFrame({"user_id": pair_user, "med_id": pair_med})
+        for w, c in zip(windows, counts):
+            df = pd.concat([df, _ratios(c, w)], axis=1)
+        return df
+
+    def per_user(self, windows: Sequence[int] = WINDOWS, now: Optional[float] = None) -> pd.DataFrame:
+        pair_user, _, counts = self._snapshot(windows, now)
+        users, inv = np.unique(pair_user, return_inverse=True)
+        df = pd.DataFrame({"user_id": users})
+        for w, wc in zip(windows, counts):
+            c = np.zeros((len(users), 3), dtype=np.int64)
+            np.add.at(c, inv, wc)
+            df = pd.concat([df, _ratios(c, w)], axis=1)
+        return df
+
+    def cohort_ranking(self, window: int = 30, now: Optional[float] = None) -> pd.DataFrame:
+        df = self.per_user((window,), now)
+        col = f"adherence_{window}d"
+        df = df[df[f"doses_{window}d"] > 0].sort_values([col, f"doses_{window}d"], ascending=False)
+        df["rank"] = np.arange(1, len(df) + 1)
+        return df.reset_index(drop=True)
+
+
+def _ratios(c: np.ndarray, w: int) -> pd.DataFrame:
+    doses = c[:, TAKEN] + c[:, MISSED]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            f"taken_{w}d": c[:, TAKEN], f"missed_{w}d": c[:, MISSED], f"late_{w}d": c[:, LATE],
+            f"doses_{w}d": doses,
+            f"adherence_{w}d": np.where(doses > 0, c[:, TAKEN] / doses, np.nan),
+            f"late_ratio_{w}d": np.where(c[:, TAKEN] > 0, c[:, LATE] / c[:, TAKEN], np.nan),
+        })
+
+
+def records(df: pd.DataFrame) -> List[dict]:
+    """DataFrame -> JSON-safe dicts (NaN ratios become None)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
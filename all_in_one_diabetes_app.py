@@ -1,20 +1,53 @@
 # backend_api.py
 import os, re, sqlite3
 from contextlib import closing
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
+from shard_store import ShardRouter
+from dose_index import DoseIndex
+from dose_schedule import due_doses, ensure_dose_schedule
+from med_catalogue import CatalogueStore
+from backup_store import BackupScheduler, list_snapshots, restore_snapshot
+from versioned_cache import VersionedCache
+from ocr_jobs import MAX_UPLOAD_BYTES, MODES as OCR_MODES, OcrJobQueue, QueueFull
 
 DB_PATH = "med_dict.db"
 
+# Optional per-user sharding (HC_SHARDS=N); None means the single DB_PATH file
+SHARDS = ShardRouter.from_env(DB_PATH)
+
 # ---------------- DB ----------------
-def db_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+def db_conn(user_id: Optional[int] = None):
+    if SHARDS is None:
+        return sqlite3.connect(DB_PATH, check_same_thread=False)
+    if user_id is None:
+        raise ValueError("db_conn() needs a user_id when sharding is enabled")
+    return SHARDS.conn_for_user(user_id)
+
+def db_conns():
+    # every store holding users: one connection per shard, or just the single file
+    return SHARDS.all_conns() if SHARDS else [db_conn()]
+
+def db_conns_for_users(user_ids: Optional[List[int]]):
+    # only the shards that own these users; every store when no cohort is given
+    if SHARDS is None or not user_ids:
+        return db_conns()
+    return [SHARDS.connect(k) for k in sorted({SHARDS.shard_for_user(u) for u in user_ids})]
+
+def db_conn_for_row(table: str, row_id: int):
+    return SHARDS.conn_for_row(table, row_id) if SHARDS else db_conn()
 
 def init_db():
+    if SHARDS is not None:
+        return  # shard schemas are created by ShardRouter.from_env
     with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+        # WAL: readers (and online backups) don't block writers
+        c.execute("PRAGMA journal_mode=WAL")
         # Users
         c.execute("""CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY,
@@ -46,9 +79,40 @@ def init_db():
             ts DATETIME DEFAULT CURRENT_TIMESTAMP
         )""")
         conn.commit()
+        # Dose schedule (one row per med and minute of day), kept in sync by triggers on meds
+        ensure_dose_schedule(conn)
 
 init_db()
 
+def load_dose_times(user_id: int):
+    with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
+        return c.execute("SELECT name, reminder_times FROM meds WHERE user_id=?", (user_id,)).fetchall()
+
+def med_owner(c, mid: int) -> Optional[int]:
+    row = c.execute("SELECT user_id FROM meds WHERE id=?", (mid,)).fetchone()
+    return row[0] if row else None
+
+# Sorted per-user dose times; invalidated by every meds write below
+NEXT_DOSES = DoseIndex(load_dose_times)
+
+def family_owner(c, fid: int) -> Optional[int]:
+    row = c.execute("SELECT user_id FROM family WHERE id=?", (fid,)).fetchone()
+    return row[0] if row else None
+
+# Read-through cache for the list endpoints; writes bump ("users",), ("family", uid),
+# ("meds", uid) and ("alerts", uid), and clients revalidate with If-None-Match
+VIEWS = VersionedCache()
+
+def cached_json(key, loader, if_none_match: Optional[str]):
+    etag, body = VIEWS.conditional(key, loader, if_none_match)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+# Drug catalogue (medicines table), loaded once; picks up file changes without a restart
+CATALOGUE = CatalogueStore(DB_PATH)
+
 # ---------------- FastAPI ----------------
 app = FastAPI(title="Diabetes Care Backend API")
 
@@ -96,86 +160,132 @@ class VitalCreate(BaseModel):
 
 # ---------------- Routes ----------------
 @app.get("/users")
-def get_users():
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
-        users = c.execute("SELECT id, name FROM users").fetchall()
-    return [{"id": u[0], "name": u[1]} for u in users]
+def get_users(if_none_match: Optional[str] = Header(None)):
+    def load():
+        users = []
+        for conn in db_conns():
+            with closing(conn), closing(conn.cursor()) as c:
+                users += c.execute("SELECT id, name FROM users").fetchall()
+        users.sort()
+        return [{"id": u[0], "name": u[1]} for u in users]
+    return cached_json(("users",), load, if_none_match)
 
 @app.post("/users")
 def add_user(u: UserCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
-        c.execute("""INSERT INTO users (name, age, diabetes_type, height_cm, weight_kg, contact)
-                     VALUES (?,?,?,?,?,?)""",
-                  (u.name, u.age, u.diabetes_type, u.height_cm, u.weight_kg, u.contact))
+    # sharded: take a global id first so we know which shard owns the user
+    uid = SHARDS.next_user_id() if SHARDS else None
+    with closing(db_conn(uid)) as conn, closing(conn.cursor()) as c:
+        c.execute("""INSERT INTO users (id, name, age, diabetes_type, height_cm, weight_kg, contact)
+                     VALUES (?,?,?,?,?,?,?)""",
+                  (uid, u.name, u.age, u.diabetes_type, u.height_cm, u.weight_kg, u.contact))
         conn.commit()
         uid = c.lastrowid
+    VIEWS.bump(("users",))
     return {"id": uid}
 
 @app.get("/family/{user_id}")
-def get_family(user_id: int):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
-        fam = c.execute("SELECT id, name, relation, phone FROM family WHERE user_id=?", (user_id,)).fetchall()
-    return [{"id": f[0], "name": f[1], "relation": f[2], "phone": f[3]} for f in fam]
+def get_family(user_id: int, if_none_match: Optional[str] = Header(None)):
+    def load():
+        with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
+            fam = c.execute("SELECT id, name, relation, phone FROM family WHERE user_id=?", (user_id,)).fetchall()
+        return [{"id": f[0], "name": f[1], "relation": f[2], "phone": f[3]} for f in fam]
+    return cached_json(("family", user_id), load, if_none_match)
 
 @app.post("/family")
 def add_family(f: FamilyMemberCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(f.user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("INSERT INTO family (user_id, name, relation, phone) VALUES (?,?,?,?)",
                   (f.user_id, f.name, f.relation, f.phone))
         conn.commit()
         fid = c.lastrowid
+    VIEWS.bump(("family", f.user_id))
     return {"id": fid}
 
 @app.delete("/family/{fid}")
 def delete_family(fid: int):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn_for_row("family", fid)) as conn, closing(conn.cursor()) as c:
+        owner = family_owner(c, fid)
         c.execute("DELETE FROM family WHERE id=?", (fid,))
         conn.commit()
+    if owner is not None:
+        VIEWS.bump(("family", owner))
     return {"status": "deleted"}
 
+@app.get("/medicines/search")
+def search_medicines(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    return [{"form": d.form, "name": d.name, "strength": d.strength, "brands": list(d.brands), "matched": label}
+            for d, label in CATALOGUE.get().search(q, limit)]
+
 @app.get("/meds/{user_id}")
-def get_meds(user_id: int):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
-        meds = c.execute("SELECT id, form, name, strength, frequency, reminder_times FROM meds WHERE user_id=?",(user_id,)).fetchall()
-    return [{"id": m[0], "form": m[1], "name": m[2], "strength": m[3], "frequency": m[4], "times_csv": m[5]} for m in meds]
+def get_meds(user_id: int, if_none_match: Optional[str] = Header(None)):
+    def load():
+        with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
+            meds = c.execute("SELECT id, form, name, strength, frequency, reminder_times FROM meds WHERE user_id=?",(user_id,)).fetchall()
+        return [{"id": m[0], "form": m[1], "name": m[2], "strength": m[3], "frequency": m[4], "times_csv": m[5]} for m in meds]
+    return cached_json(("meds", user_id), load, if_none_match)
 
 @app.post("/meds")
 def add_meds(m: MedCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(m.user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("""INSERT INTO meds (user_id, form, name, strength, frequency, reminder_times)
                      VALUES (?,?,?,?,?,?)""",
                   (m.user_id, m.form, m.name, m.strength, m.frequency, m.times_csv))
         conn.commit()
         mid = c.lastrowid
+    NEXT_DOSES.invalidate(m.user_id)
+    VIEWS.bump(("meds", m.user_id), ("alerts", m.user_id))
     return {"id": mid}
 
 @app.put("/meds/{mid}")
 def edit_med(mid: int, m: MedCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn_for_row("meds", mid)) as conn, closing(conn.cursor()) as c:
+        owner = med_owner(c, mid)
         c.execute("""UPDATE meds SET form=?, name=?, strength=?, frequency=?, reminder_times=? WHERE id=?""",
                   (m.form, m.name, m.strength, m.frequency, m.times_csv, mid))
         conn.commit()
+    NEXT_DOSES.invalidate(owner)
+    if owner is not None:
+        VIEWS.bump(("meds", owner), ("alerts", owner))
     return {"status": "updated"}
 
 @app.delete("/meds/{mid}")
 def delete_med(mid: int):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn_for_row("meds", mid)) as conn, closing(conn.cursor()) as c:
+        owner = med_owner(c, mid)
         c.execute("DELETE FROM meds WHERE id=?", (mid,))
         conn.commit()
+    NEXT_DOSES.invalidate(owner)
+    if owner is not None:
+        VIEWS.bump(("meds", owner), ("alerts", owner))
     return {"status": "deleted"}
 
+@app.get("/next_dose/{user_id}")
+def next_dose(user_id: int, n: int = Query(3, ge=1, le=50)):
+    return {"user_id": user_id, "doses": NEXT_DOSES.next_doses(user_id, n)}
+
+@app.get("/due")
+def due(window: int = Query(5, ge=1, le=1440)):
+    # doses due in the next `window` minutes across all patients: one index range scan per store
+    out = []
+    for conn in db_conns():
+        with closing(conn):
+            out.extend(due_doses(conn, window))
+    out.sort(key=lambda d: (d["at"], d["user_id"]))
+    return out
+
 @app.post("/logs")
 def add_log(l: LogCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(l.user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("INSERT INTO logs (user_id, med_id, status, note) VALUES (?,?,?,?)",
                   (l.user_id, l.med_id, l.status, l.note))
         conn.commit()
         lid = c.lastrowid
+    VIEWS.bump(("alerts", l.user_id))
     return {"id": lid}
 
 @app.get("/logs/{user_id}")
 def get_logs(user_id: int, limit: int = 50):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
         logs = c.execute("""SELECT l.ts, m.name, l.status, l.note
                             FROM logs l LEFT JOIN meds m ON l.med_id=m.id
                             WHERE l.user_id=? ORDER BY l.ts DESC LIMIT ?""",
@@ -184,16 +294,168 @@ def get_logs(user_id: int, limit: int = 50):
 
 @app.post("/vitals")
 def add_vitals(v: VitalCreate):
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(v.user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("INSERT INTO vitals (user_id, kind, value) VALUES (?,?,?)",
                   (v.user_id, v.kind, v.value))
         conn.commit()
+    VIEWS.bump(("alerts", v.user_id))
     return {"status": "ok"}
 
+# ---------------- Columnar export ----------------
+@app.get("/export/{table}")
+def export_table(table: str, user_id: Optional[List[int]] = Query(None)):
+    """Arrow IPC stream of users/meds/logs/vitals for one user, a cohort (?user_id=1&user_id=2) or everyone."""
+    from export_columnar import TABLES, arrow_stream_chunks
+    if table not in TABLES:
+        raise HTTPException(404, f"unknown table {table!r}; expected one of {sorted(TABLES)}")
+    conns = db_conns_for_users(user_id)
+
+    def body():
+        try:
+            yield from arrow_stream_chunks(conns, table, user_id)
+        finally:
+            for conn in conns:
+                conn.close()
+    return StreamingResponse(body(), media_type="application/vnd.apache.arrow.stream",
+                             headers={"Content-Disposition": f'attachment; filename="{table}.arrows"'})
+
+# ---------------- Adherence analytics ----------------
+ADHERENCE = None
+
+def adherence_engine():
+    # built on first use (pulls in numpy/pandas), then refreshed from new log rows only
+    global ADHERENCE
+    from adherence import AdherenceEngine
+    if ADHERENCE is None:
+        ADHERENCE = AdherenceEngine()
+    conns = db_conns()
+    try:
+        ADHERENCE.refresh(conns)
+    finally:
+        for conn in conns:
+            conn.close()
+    return ADHERENCE
+
+@app.get("/adherence/cohort")
+def adherence_cohort(window: int = Query(30, ge=1, le=90), limit: int = 50):
+    from adherence import records
+    return records(adherence_engine().cohort_ranking(window).head(limit))
+
+@app.get("/adherence/{user_id}")
+def adherence_user(user_id: int):
+    from adherence import records
+    engine = adherence_engine()
+    per_user = engine.per_user()
+    per_med = engine.per_med()
+    with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
+        names = dict(c.execute("SELECT id, name FROM meds WHERE user_id=?", (user_id,)).fetchall())
+    meds = records(per_med[per_med.user_id == user_id])
+    for m in meds:
+        m["medicine"] = names.get(m["med_id"])
+    overall = records(per_user[per_user.user_id == user_id])
+    return {"user_id": user_id, "overall": overall[0] if overall else None, "meds": meds}
+
+# ---------------- Backups ----------------
+# Online snapshots every HC_BACKUP_INTERVAL_MIN minutes (off when unset)
+BACKUP_DIR = os.environ.get("HC_BACKUP_DIR", "backups")
+
+def db_files():
+    if SHARDS is None:
+        return [DB_PATH]
+    return [SHARDS.shard_path(k) for k in range(SHARDS.shard_count)] + [SHARDS.seq_path()]
+
+BACKUPS = None
+if os.environ.get("HC_BACKUP_INTERVAL_MIN"):
+    BACKUPS = BackupScheduler(db_files, BACKUP_DIR, float(os.environ["HC_BACKUP_INTERVAL_MIN"]) * 60,
+                              keep=int(os.environ.get("HC_BACKUP_KEEP", "24"))).start()
+
+@app.get("/backups")
+def backups():
+    return {
+        "enabled": BACKUPS is not None,
+        "last_snapshot": BACKUPS.last_snapshot if BACKUPS else None,
+        "last_error": BACKUPS.last_error if BACKUPS else None,
+        "last_error_at": BACKUPS.last_error_at if BACKUPS else None,
+        "consecutive_failures": BACKUPS.failures if BACKUPS else 0,
+        "snapshots": [os.path.basename(s) for s in list_snapshots(BACKUP_DIR)],
+    }
+
+def reset_caches():
+    # everything in memory that was built from database contents
+    global ADHERENCE
+    NEXT_DOSES.invalidate_all()
+    VIEWS.clear()
+    ADHERENCE = None
+    CATALOGUE.reload()
+
+@app.post("/backups/restore/{name}")
+def restore_backup(name: str):
+    snaps = {os.path.basename(s): s for s in list_snapshots(BACKUP_DIR)}
+    if name not in snaps:
+        raise HTTPException(404, "unknown snapshot")
+    into = SHARDS.shard_dir if SHARDS else (os.path.dirname(DB_PATH) or ".")
+    restored = restore_snapshot(snaps[name], into)
+    reset_caches()
+    return {"snapshot": name, "restored": restored}
+
+# ---------------- OCR jobs ----------------
+# Uploads are OCR'd in a fixed-size process pool behind a bounded queue (HC_OCR_WORKERS / HC_OCR_QUEUE)
+OCR_JOBS = OcrJobQueue(workers=int(os.environ.get("HC_OCR_WORKERS", "2")),
+                       max_queued=int(os.environ.get("HC_OCR_QUEUE", "8")))
+
+@app.post("/ocr", status_code=202)
+async def submit_ocr(request: Request, mode: str = "layout"):
+    # body is the raw image (Content-Type: image/png, image/jpeg, ...)
+    if mode not in OCR_MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(OCR_MODES)}")
+    too_big = HTTPException(413, f"image larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    declared = request.headers.get("content-length")
+    if declared is not None and not declared.isdigit():
+        raise HTTPException(400, "bad Content-Length")
+    if declared is not None and int(declared) > MAX_UPLOAD_BYTES:
+        raise too_big
+    # the header is optional (chunked uploads) and only a claim: count while reading
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_UPLOAD_BYTES:
+            raise too_big
+    body = bytes(body)
+    if not body:
+        raise HTTPException(400, "empty upload")
+    try:
+        # submit() takes the queue lock and may start worker processes: keep it off the event loop
+        job = await run_in_threadpool(OCR_JOBS.submit, body, mode)
+    except QueueFull as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": str(e.retry_after_s)})
+    return OCR_JOBS.status(job)
+
+@app.get("/ocr/stats")
+def ocr_stats():
+    return OCR_JOBS.stats()
+
+@app.get("/ocr/{job_id}")
+async def ocr_job(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    # wait > 0 long-polls: the response comes back as soon as the job finishes.
+    # Awaited on the event loop, so waiting clients don't each tie up a threadpool worker
+    job = OCR_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown or expired job")
+    if wait > 0:
+        await OCR_JOBS.wait(job, wait)
+    return OCR_JOBS.status(job)
+
+@app.delete("/ocr/{job_id}")
+def cancel_ocr(job_id: str):
+    job = OCR_JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown or expired job")
+    return OCR_JOBS.status(job)
+
 # ---------------- Real-Time Alerts ----------------
 def check_abnormal_vitals(user_id: int):
     alerts = []
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("SELECT kind, value FROM vitals WHERE user_id=? ORDER BY ts DESC", (user_id,))
         vitals = {row[0]: row[1] for row in c.fetchall()}
 
@@ -220,7 +482,7 @@ def check_abnormal_vitals(user_id: int):
 
 def check_missed_meds(user_id: int, threshold=3):
     alerts = []
-    with closing(db_conn()) as conn, closing(conn.cursor()) as c:
+    with closing(db_conn(user_id)) as conn, closing(conn.cursor()) as c:
         c.execute("""SELECT m.name, COUNT(*) as missed
                      FROM logs l JOIN meds m ON l.med_id=m.id
                      WHERE l.user_id=? AND l.status='Missed'
@@ -231,8 +493,15 @@ def check_missed_meds(user_id: int, threshold=3):
     return alerts
 
 @app.get("/new_alerts")
-def new_alerts(user_id: int = Query(...)):
-    alerts = []
-    alerts += check_abnormal_vitals(user_id)
-    alerts += check_missed_meds(user_id)
-    return {"alerts": alerts}
+def new_alerts(user_id: int = Query(...), if_none_match: Optional[str] = Header(None)):
+    # depends on vitals, logs and meds: every write to those bumps ("alerts", user_id)
+    def load():
+        alerts = []
+        alerts += check_abnormal_vitals(user_id)
+        alerts += check_missed_meds(user_id)
+        return {"alerts": alerts}
+    return cached_json(("alerts", user_id), load, if_none_match)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return VIEWS.stats()
@@ -0,0 +1,199 @@
+# backup_store.py
+# Online backups of the SQLite stores through SQLite's backup API.
+# Pages are copied in small steps with a short sleep in between, so the backend
+# keeps taking writes while a backup runs (see backup_db for WAL vs rollback mode).
+#
+#   python backup_store.py snapshot med_dict.db --dir backups --keep 24
+#   python backup_store.py list --dir backups
+#   python backup_store.py restore backups/20250902-162000 --into .
+#
+# Every snapshot is a full copy of each file (not incremental); the scheduler only
+# skips a run when no file changed since the last one.
+# The backend takes snapshots on a timer when HC_BACKUP_INTERVAL_MIN is set, and
+# restores through POST /backups/restore/<snapshot>, which also drops its caches.
+import argparse, logging, os, shutil, sqlite3, threading, time
+from contextlib import closing
+from datetime import datetime
+from typing import Callable, List, Optional
+
+log = logging.getLogger(__name__)
+
+STEP_PAGES = 64          # pages per step (~256 KB with 4 KB pages)
+STEP_SLEEP_S = 0.005     # pause between steps; writers get the database in between
+SNAPSHOT_FMT = "%Y%m%d-%H%M%S"
+MAX_RESTARTS = 3         # rollback-journal only: restarts tolerated before one-step copy
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_db(src_path: str, dest_path: str, pages: int = STEP_PAGES, sleep_s: float = STEP_SLEEP_S,
+              progress: Optional[Callable[[int, int, int], None]] = None) -> float:
+    """Copy a live database to dest_path page-step by page-step; returns seconds taken.
+
+    WAL databases: a read transaction pins the snapshot being copied, so concurrent
+    writes neither block nor restart the copy. Rollback-journal databases restart on
+    every write from another connection; after MAX_RESTARTS the rest is copied in
+    one step (writers wait for that step only)."""
+    t0 = time.perf_counter()
+    tmp = dest_path + ".part"
+    seen = {"remaining": None, "restarts": 0}
+
+    def step(status, remaining, total):
+        if seen["remaining"] is not None and remaining > seen["remaining"]:
+            seen["restarts"] += 1
+            if seen["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        seen["remaining"] = remaining
+        if progress:
+            progress(status, remaining, total)
+        if sleep_s and remaining:
+            time.sleep(sleep_s)   # locks are released between steps; let writers in
+
+    with closing(sqlite3.connect(src_path, timeout=30, isolation_level=None)) as src, \
+            closing(sqlite3.connect(tmp)) as dst:
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        try:
+            src.backup(dst, pages=pages, progress=step)
+        except _TooManyRestarts:
+            src.backup(dst, pages=-1)
+        finally:
+            if wal:
+                src.execute("COMMIT")
+    os.replace(tmp, dest_path)   # never leave a half-written file under the real name
+    return time.perf_counter() - t0
+
+
+def _state(paths: List[str]) -> tuple:
+    # cheap "anything changed?" check: size + mtime of each file and its WAL
+    out = []
+    for p in paths:
+        for f in (p, p + "-wal"):
+            try:
+                st = os.stat(f)
+                out.append((f, st.st_size, st.st_mtime_ns))
+            except OSError:
+                pass
+    return tuple(out)
+
+
+def list_snapshots(backup_dir: str) -> List[str]:
+    if not os.path.isdir(backup_dir):
+        return []
+    names = []
+    for n in os.listdir(backup_dir):
+        try:
+            datetime.strptime(n, SNAPSHOT_FMT)
+            names.append(n)
+        except ValueError:
+            continue
+    return [os.path.join(backup_dir, n) for n in sorted(names)]
+
+
+def take_snapshot(paths: List[str], backup_dir: str, keep: int = 24, **step) -> str:
+    """Back up every file in `paths` into a new timestamped folder and apply retention."""
+    snap = os.path.join(backup_dir, datetime.now().strftime(SNAPSHOT_FMT))
+    os.makedirs(snap, exist_ok=True)
+    for p in paths:
+        backup_db(p, os.path.join(snap, os.path.basename(p)), **step)
+    prune_snapshots(backup_dir, keep)
+    return snap
+
+
+def prune_snapshots(backup_dir: str, keep: int):
+    snaps = list_snapshots(backup_dir)
+    for old in snaps[:max(0, len(snaps) - keep)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def restore_snapshot(snapshot_dir: str, into_dir: str, **step) -> List[str]:
+    """Copy each database in the snapshot over the same-named file in into_dir.
+
+    Uses the backup API in the other direction, so open connections read the restored
+    pages on their next transaction instead of a file swapped under them. In-memory
+    state built from the old data (the backend's dose index, adherence counts and
+    response cache) is not touched: restore through the backend, or restart it."""
+    restored = []
+    for name in sorted(os.listdir(snapshot_dir)):
+        if not name.endswith(".db"):
+            continue
+        target = os.path.join(into_dir, name)
+        with closing(sqlite3.connect(os.path.join(snapshot_dir, name))) as src, \
+                closing(sqlite3.connect(target, timeout=30)) as dst:
+            src.backup(dst, pages=step.get("pages", STEP_PAGES), sleep=step.get("sleep_s", STEP_SLEEP_S))
+        restored.append(target)
+    return restored
+
+
+class BackupScheduler:
+    """Daemon thread taking a snapshot every interval_s, skipped when nothing changed."""
+
+    def __init__(self, paths_fn: Callable[[], List[str]], backup_dir: str, interval_s: float, keep: int = 24):
+        self.paths_fn = paths_fn
+        self.backup_dir = backup_dir
+        self.interval_s = interval_s
+        self.keep = keep
+        self.last_state = None
+        self.last_snapshot: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.failures = 0                        # consecutive failed runs
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> Optional[str]:
+        paths = self.paths_fn()
+        state = _state(paths)
+        if state == self.last_state:
+            return None
+        try:
+            self.last_snapshot = take_snapshot(paths, self.backup_dir, self.keep)
+            self.last_state, self.last_error, self.failures = state, None, 0
+        except Exception as e:
+            self.last_error, self.last_error_at = f"{type(e).__name__}: {e}", time.time()
+            self.failures += 1
+            log.exception("backup to %s failed", self.backup_dir)
+        return self.last_snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.run_once()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Online SQLite backup / restore")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("snapshot", help="take a snapshot now")
+    sp.add_argument("db", nargs="+", help="database file(s), e.g. med_dict.db or med_dict_shards/*.db")
+    sp.add_argument("--dir", default="backups")
+    sp.add_argument("--keep", type=int, default=24)
+    lp = sub.add_parser("list", help="list snapshots")
+    lp.add_argument("--dir", default="backups")
+    rp = sub.add_parser("restore", help="restore a snapshot")
+    rp.add_argument("snapshot")
+    rp.add_argument("--into", default=".", help="folder holding the live database(s)")
+    args = ap.parse_args()
+
+    if args.cmd == "snapshot":
+        t0 = time.perf_counter()
+        snap = take_snapshot(args.db, args.dir, args.keep)
+        print(f"✅ Snapshot {snap} ({time.perf_counter() - t0:.2f}s)")
+    elif args.cmd == "list":
+        for s in list_snapshots(args.dir):
+            size = sum(os.path.getsize(os.path.join(s, f)) for f in os.listdir(s))
+            print(f"{os.path.basename(s)}  {size:>12,d} bytes")
+    elif args.cmd == "restore":
+        for path in restore_snapshot(args.snapshot, args.into):
+            print(f"✅ Restored {path}")
+        print("Restart a running backend (or use POST /backups/restore) so it drops its caches.")
@@ -0,0 +1,74 @@
+# bench_backup.py
+# Write latency on the /logs and /vitals insert path while a backup runs.
+#
+#   python bench_backup.py --logs 300000
+#
+# A writer thread repeats the backend's POST /logs and POST /vitals statements
+# (one connection + commit per request) while the main thread takes:
+#   idle     - no backup, baseline
+#   locked   - file copy under BEGIN EXCLUSIVE (the only safe plain copy)
+#   online   - backup_store.backup_db (SQLite backup API, small page steps)
+import argparse, os, shutil, sqlite3, tempfile, threading, time
+from contextlib import closing
+from statistics import median
+
+from backup_store import backup_db
+from bench_export import seed
+
+
+def writer(db: str, stop: threading.Event, out: list):
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        with closing(sqlite3.connect(db, timeout=30)) as conn:
+            if i % 2:
+                conn.execute("INSERT INTO logs (user_id, med_id, status, note) VALUES (?,?,?,?)", (1, 1, "Taken", "bench"))
+            else:
+                conn.execute("INSERT INTO vitals (user_id, kind, value) VALUES (?,?,?)", (1, "spo2", 97))
+            conn.commit()
+        out.append((time.perf_counter() - t0) * 1000)
+        i += 1
+        time.sleep(0.002)   # ~ a steady stream of requests, not a tight loop
+
+
+def locked_copy(db: str, dest: str):
+    with closing(sqlite3.connect(db, timeout=30, isolation_level=None)) as conn:
+        conn.execute("BEGIN EXCLUSIVE")
+        shutil.copyfile(db, dest)
+        conn.execute("COMMIT")
+
+
+def phase(db: str, action) -> tuple:
+    lat, stop = [], threading.Event()
+    t = threading.Thread(target=writer, args=(db, stop, lat))
+    t.start()
+    time.sleep(0.3)
+    t0 = time.perf_counter()
+    action()
+    took = time.perf_counter() - t0
+    stop.set()
+    t.join()
+    lat.sort()
+    return took, len(lat), median(lat), lat[int(len(lat) * 0.99) - 1], lat[-1]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Write latency during backups")
+    ap.add_argument("--logs", type=int, default=300000, help="rows of history to seed")
+    ap.add_argument("--journal", choices=["wal", "delete"], default="wal", help="journal mode of the live DB")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "live.db")
+        seed(db, 100, args.logs // 100)
+        if args.journal == "wal":
+            with closing(sqlite3.connect(db)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+        print(f"database: {os.path.getsize(db) / 1e6:.1f} MB, journal_mode={args.journal}\n")
+        print(f"{'mode':>7} {'backup s':>9} {'writes':>7} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+        runs = [("idle", lambda: time.sleep(1.0)),
+                ("locked", lambda: locked_copy(db, os.path.join(tmp, "copy.db"))),
+                ("online", lambda: backup_db(db, os.path.join(tmp, "online.db")))]
+        for label, action in runs:
+            took, n, p50, p99, mx = phase(db, action)
+            print(f"{label:>7} {took:>9.2f} {n:>7d} {p50:>7.2f} {p99:>7.2f} {mx:>7.1f}")
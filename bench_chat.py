@@ -0,0 +1,71 @@
+# bench_chat.py
+# Offline chat latency / cache benchmark against fake_llm_server.py.
+#
+#   python bench_chat.py --turns 40
+#
+# Replays conversations (several patients sharing one cache) mixing repeated FAQ
+# questions with follow-ups and reports time-to-first-token, full-reply time,
+# prompt size and cache hit rate, with and without the response cache.
+import argparse, random, time
+from statistics import mean
+
+import fake_llm_server
+from chat_backend import ChatSession, OpenAIChat, ResponseCache, estimate_tokens
+
+FAQ = [
+    "What does metformin do?",
+    "what does Metformin do",
+    "How does insulin work?",
+    "How should I store insulin?",
+    "What is a normal blood sugar level?",
+]
+FOLLOW_UPS = ["Can you explain that again?", "Is it safe with food?", "Thanks, anything else I should know?"]
+
+
+def run(url: str, turns: int, use_cache: bool, budget: int, per_session: int = 4, seed: int = 7) -> dict:
+    rnd = random.Random(seed)
+    model = OpenAIChat("fake", base_url=url)
+    cache = ResponseCache() if use_cache else None
+    ttft, total, prompt_tokens = [], [], []
+    for i in range(turns):
+        if i % per_session == 0:
+            # a new patient's conversation; only the shared cache carries over
+            session = ChatSession(model, cache, history_budget=budget)
+            history = []
+        q = rnd.choice(FAQ) if rnd.random() < 0.7 else rnd.choice(FOLLOW_UPS)
+        history.append(("user", q))
+        t0 = time.perf_counter()
+        first, parts = None, []
+        for delta in session.stream_answer(history):
+            if first is None:
+                first = time.perf_counter() - t0
+            parts.append(delta)
+        total.append(time.perf_counter() - t0)
+        ttft.append(first or total[-1])
+        history.append(("bot", "".join(parts)))
+        prompt_tokens.append(sum(estimate_tokens(m["content"]) for m in session.build_messages(history)))
+    return {
+        "ttft_ms": mean(ttft) * 1000,
+        "reply_ms": mean(total) * 1000,
+        "max_prompt_tokens": max(prompt_tokens),
+        "hit_rate": cache.hit_rate() if cache else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chat backend latency / cache benchmark")
+    ap.add_argument("--turns", type=int, default=40)
+    ap.add_argument("--budget", type=int, default=400, help="history token budget")
+    ap.add_argument("--per-session", type=int, default=4, help="turns per simulated conversation")
+    ap.add_argument("--first-token-ms", type=float, default=200)
+    ap.add_argument("--token-ms", type=float, default=5)
+    args = ap.parse_args()
+
+    server, url = fake_llm_server.start(0, args.first_token_ms, args.token_ms)
+    try:
+        print(f"{'mode':>8} {'ttft ms':>8} {'reply ms':>9} {'max prompt tok':>15} {'hit rate':>9}")
+        for label, use_cache in (("no-cache", False), ("cache", True)):
+            r = run(url, args.turns, use_cache, args.budget, args.per_session)
+            print(f"{label:>8} {r['ttft_ms']:>8.0f} {r['reply_ms']:>9.0f} {r['max_prompt_tokens']:>15d} {r['hit_rate']:>8.0%}")
+    finally:
+        server.shutdown()
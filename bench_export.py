@@ -0,0 +1,92 @@
+# bench_export.py
+# Size / speed of the JSON list-of-dicts path (as /logs and /meds build it)
+# versus the columnar export, on a synthetic history.
+#
+#   python bench_export.py --users 200 --logs-per-user 500
+import argparse, json, os, random, sqlite3, tempfile, time, tracemalloc
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from export_columnar import FORMATS, PARQUET_OK, TABLES, export_history
+from shard_store import SCHEMA
+
+MEDS = [("Tab.", "Metformin", "500mg", "Twice daily", "08:00,20:00"),
+        ("Tab.", "Glimepiride", "2mg", "Once a day", "08:00"),
+        ("Inj.", "Insulin Glargine", "20 units", "Every night at bedtime", "22:00")]
+VITALS = ["blood_sugar_random", "hba1c", "bp_sys", "bp_dia", "heart_rate", "spo2"]
+
+
+def seed(path: str, users: int, logs_per_user: int):
+    rnd = random.Random(1)
+    t0 = datetime(2025, 1, 1)
+    with closing(sqlite3.connect(path)) as conn:
+        for ddl in SCHEMA:
+            conn.execute(ddl)
+        for uid in range(1, users + 1):
+            conn.execute("INSERT INTO users (id, name, age, diabetes_type) VALUES (?,?,?,?)",
+                         (uid, f"Patient {uid}", rnd.randint(20, 80), rnd.choice(["Type 1", "Type 2"])))
+            med_ids = [conn.execute("INSERT INTO meds (user_id, form, name, strength, frequency, reminder_times) "
+                                    "VALUES (?,?,?,?,?,?)", (uid,) + m).lastrowid for m in MEDS]
+            conn.executemany("INSERT INTO logs (user_id, med_id, status, note, ts) VALUES (?,?,?,?,?)",
+                             [(uid, rnd.choice(med_ids), rnd.choice(["Taken", "Taken", "Taken", "Missed"]),
+                               "User confirmed", (t0 + timedelta(minutes=37 * i)).strftime("%Y-%m-%d %H:%M:%S"))
+                              for i in range(logs_per_user)])
+            conn.executemany("INSERT INTO vitals (user_id, kind, value, ts) VALUES (?,?,?,?)",
+                             [(uid, rnd.choice(VITALS), round(rnd.uniform(60, 200), 1),
+                               (t0 + timedelta(hours=13 * i)).strftime("%Y-%m-%d %H:%M:%S"))
+                              for i in range(logs_per_user // 10)])
+        conn.commit()
+
+
+def export_json(conn, out_dir: str):
+    # the backend's approach: fetchall, list of dicts, json.dumps
+    os.makedirs(out_dir, exist_ok=True)
+    for t, schema in TABLES.items():
+        rows = conn.execute(f"SELECT {', '.join(schema.names)} FROM {t}").fetchall()
+        payload = [dict(zip(schema.names, r)) for r in rows]
+        with open(os.path.join(out_dir, t + ".json"), "w") as f:
+            f.write(json.dumps(payload))
+
+
+def measure(fn) -> tuple:
+    # best of 3 (skips one-off import / codec setup); memory is a separate pass
+    # because tracemalloc slows allocation-heavy code unevenly
+    elapsed = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = min(elapsed, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="JSON vs columnar export benchmark")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--logs-per-user", type=int, default=500)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.db")
+        seed(db, args.users, args.logs_per_user)
+        with closing(sqlite3.connect(db)) as conn:   # warm the page cache so the first format isn't penalized
+            for t in TABLES:
+                conn.execute(f"SELECT * FROM {t}").fetchall()
+        print(f"{args.users} users, {args.users * args.logs_per_user} logs\n")
+        print(f"{'format':>8} {'seconds':>8} {'MB on disk':>11} {'peak py MB':>11}")
+        runs = [("json", lambda conn, out: export_json(conn, out))]
+        for fmt in FORMATS:
+            if fmt != "parquet" or PARQUET_OK:
+                runs.append((fmt, lambda conn, out, fmt=fmt: export_history([conn], out, None, fmt)))
+        for label, run in runs:
+            out = os.path.join(tmp, label)
+            with closing(sqlite3.connect(db)) as conn:
+                secs, peak = measure(lambda: run(conn, out))
+            print(f"{label:>8} {secs:>8.2f} {dir_size(out) / 1e6:>11.2f} {peak / 1e6:>11.1f}")
@@ -0,0 +1,58 @@
+# bench_ocr_layout.py
+# Full-page OCR (ocr_any + parse_prescription_text) vs layout-aware OCR
+# (layout_ocr.ocr_prescription) on the bundled sample prescriptions.
+#
+#   python bench_ocr_layout.py [extra images...]
+#
+# Reports per-image latency and medicines extracted; for the zipped dataset the
+# expected count comes from prescriptions_metadata.csv.
+import csv, glob, io, os, sys, time, zipfile
+from statistics import mean
+
+import pytesseract
+from PIL import Image
+
+from layout_ocr import ocr_prescription
+from rx_parser import parse_prescription_text
+
+DATASET_ZIP = "diabetes_prescriptions_dataset_fixed.zip"
+
+
+def load_samples(extra):
+    samples = []   # (label, PIL image, expected med count or None)
+    if os.path.exists(DATASET_ZIP):
+        with zipfile.ZipFile(DATASET_ZIP) as zf:
+            meta = {r["ImageFile"]: r for r in csv.DictReader(io.TextIOWrapper(zf.open("prescriptions_metadata.csv")))}
+            for name in sorted(zf.namelist()):
+                if name.lower().endswith(".png"):
+                    img = Image.open(io.BytesIO(zf.read(name)))
+                    img.load()
+                    expected = len(meta[name]["Medicines"].split("|")) if name in meta else None
+                    samples.append((name, img, expected))
+    for path in sorted(glob.glob("*.png")) + list(extra):
+        samples.append((os.path.basename(path), Image.open(path), None))
+    return samples
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+if __name__ == "__main__":
+    samples = load_samples(sys.argv[1:])
+    rows = []
+    print(f"{'image':38s} {'full ms':>8} {'layout ms':>9} {'full':>5} {'layout':>6} {'expected':>8}")
+    for label, img, expected in samples:
+        full, full_ms = timed(lambda: parse_prescription_text(pytesseract.image_to_string(img)))
+        (_, lay), lay_ms = timed(lambda: ocr_prescription(img))
+        rows.append((full_ms, lay_ms, len(full), len(lay), expected))
+        print(f"{label[:38]:38s} {full_ms:>8.0f} {lay_ms:>9.0f} {len(full):>5d} {len(lay):>6d} {expected if expected is not None else '-':>8}")
+
+    known = [r for r in rows if r[4]]
+    print(f"\nmean latency: full {mean(r[0] for r in rows):.0f} ms, layout {mean(r[1] for r in rows):.0f} ms")
+    if known:
+        total = sum(r[4] for r in known)
+        print(f"extraction rate (dataset): full {sum(min(r[2], r[4]) for r in known) / total:.0%}, "
+              f"layout {sum(min(r[3], r[4]) for r in known) / total:.0%}")
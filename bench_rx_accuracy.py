@@ -0,0 +1,294 @@
+# bench_rx_accuracy.py
+# Accuracy / throughput harness for the prescription pipeline:
+# image -> OCR -> parse_prescription_text, scored field by field (form, name,
+# strength, frequency) against prescriptions_metadata.csv.
+#
+#   python bench_rx_accuracy.py --pipeline full   --out results/full.json
+#   python bench_rx_accuracy.py --pipeline layout --out results/layout.json --baseline results/full.json
+#   python bench_rx_accuracy.py --pipeline full --tess-config "--oem 1 --psm 6" --images more_scans/
+#   python bench_rx_accuracy.py --pipeline text        # parser only, on the metadata text (no OCR)
+#
+# Extra --images folders are scored when they hold their own prescriptions_metadata.csv
+# (same columns as the dataset's); otherwise they only contribute latency and memory.
+# With --baseline the run fails (exit 1) if F1 drops or median latency grows past the limits.
+import argparse, csv, glob, io, json, multiprocessing, os, platform, re, subprocess, sys, time, tracemalloc, zipfile
+try:
+    import resource   # Unix only; without it the OCR process RSS is reported as n/a
+except ImportError:
+    resource = None
+from datetime import datetime
+from statistics import median
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from med_catalogue import normalize
+from rx_parser import frequency_to_times, parse_prescription_text
+
+DATASET_ZIP = "diabetes_prescriptions_dataset_fixed.zip"
+METADATA_CSV = "prescriptions_metadata.csv"
+FIELDS = ("form", "name", "strength", "frequency")
+IMAGE_EXT = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+
+
+# ---------------- ground truth ----------------
+def expected_items(medicines: str) -> List[dict]:
+    """'Tab. Metformin 500mg - 1 tablet after meals - Twice daily | ...' -> [{form, name, strength, frequency}]"""
+    items = []
+    for entry in medicines.split("|"):
+        parts = [p.strip() for p in entry.split(" - ")]
+        m = re.match(r"(\S+\.?)\s+(.+?)\s+([\d.]+\s*(?:mg|ng|IU/ml|units?|ml))\s*$", parts[0], re.IGNORECASE)
+        if not m:
+            continue
+        items.append({"form": m.group(1), "name": m.group(2), "strength": m.group(3),
+                      "frequency": parts[-1] if len(parts) > 1 else ""})
+    return items
+
+
+def _norm_frequency(text: str) -> str:
+    t = normalize(text)
+    if t in ("once daily", "once a day"):
+        return "once a day"
+    # the app's own labels ("Twice daily", "Every night at bedtime", ...)
+    return next((normalize(f) for f in frequency_to_times if normalize(f) == t), t)
+
+
+NORMALIZERS = {
+    "form": lambda s: {"mj": "inj", "cap": "caps"}.get(normalize(s), normalize(s)),   # mj. = OCR'd Inj.
+    "name": normalize,
+    "strength": lambda s: re.sub(r"\s+", "", (s or "").lower()).replace("units", "unit"),
+    "frequency": _norm_frequency,
+}
+
+
+def load_samples(image_dirs: List[str]) -> List[dict]:
+    """[{label, image, text (ground-truth text or None), expected (items or None)}]"""
+    samples = []
+    if os.path.exists(DATASET_ZIP):
+        with zipfile.ZipFile(DATASET_ZIP) as zf:
+            meta = {r["ImageFile"]: r for r in csv.DictReader(io.TextIOWrapper(zf.open(METADATA_CSV)))}
+            for name in sorted(zf.namelist()):
+                if name.lower().endswith(IMAGE_EXT):
+                    img = Image.open(io.BytesIO(zf.read(name)))
+                    img.load()
+                    row = meta.get(name)
+                    samples.append({"label": f"dataset/{name}", "image": img,
+                                    "text": row["Medicines"].replace("|", "\n") if row else None,
+                                    "expected": expected_items(row["Medicines"]) if row else None})
+    for d in image_dirs:
+        meta_path = os.path.join(d, METADATA_CSV)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, newline="") as f:
+                meta = {r["ImageFile"]: r for r in csv.DictReader(f)}
+        for path in sorted(glob.glob(os.path.join(d, "*"))):
+            if path.lower().endswith(IMAGE_EXT):
+                row = meta.get(os.path.basename(path))
+                samples.append({"label": path, "image": Image.open(path),
+                                "text": row["Medicines"].replace("|", "\n") if row else None,
+                                "expected": expected_items(row["Medicines"]) if row else None})
+    return samples
+
+
+# ---------------- pipelines ----------------
+def make_pipeline(name: str, tess_config: str):
+    if name == "text":
+        return lambda s: parse_prescription_text(s["text"] or "")
+    import pytesseract
+    if name == "full":
+        # what the app does today: ocr_any + parse_prescription_text
+        return lambda s: parse_prescription_text(pytesseract.image_to_string(s["image"], config=tess_config))
+    if name == "layout":
+        from layout_ocr import ocr_prescription
+        return lambda s: ocr_prescription(s["image"])[1]
+    raise ValueError(f"unknown pipeline {name!r}")
+
+
+# ---------------- scoring ----------------
+def score(predicted: List[dict], expected: List[dict]) -> Dict[str, List[int]]:
+    """Per field [true positives, predicted, expected]. Items are paired greedily by name
+    similarity, leftovers in order; a field is a hit when its normalized value matches
+    the paired item's."""
+    def overlap(a, b):
+        wa, wb = set(normalize(a.get("name")).split()), set(normalize(b.get("name")).split())
+        return len(wa & wb) / max(1, len(wa | wb))
+
+    pairs, used = [], set()
+    for p in predicted:
+        best = max(((overlap(p, e), j) for j, e in enumerate(expected) if j not in used), default=(0, None))
+        if best[1] is not None and best[0] > 0:
+            used.add(best[1])
+            pairs.append((p, expected[best[1]]))
+    # names too garbled to match: pair the rest by position so the other fields still count
+    rest_p = [p for p in predicted if all(p is not q for q, _ in pairs)]
+    rest_e = [e for j, e in enumerate(expected) if j not in used]
+    pairs += list(zip(rest_p, rest_e))
+    counts = {}
+    for f in FIELDS:
+        norm = NORMALIZERS[f]
+        tp = sum(1 for p, e in pairs if norm(p.get(f, "")) and norm(p.get(f, "")) == norm(e[f]))
+        counts[f] = [tp, sum(1 for p in predicted if norm(p.get(f, ""))), sum(1 for e in expected if norm(e[f]))]
+    return counts
+
+
+def prf(tp: int, n_pred: int, n_exp: int) -> dict:
+    p = tp / n_pred if n_pred else 0.0
+    r = tp / n_exp if n_exp else 0.0
+    return {"precision": round(p, 4), "recall": round(r, 4), "f1": round(2 * p * r / (p + r), 4) if p + r else 0.0,
+            "tp": tp, "predicted": n_pred, "expected": n_exp}
+
+
+# ---------------- run ----------------
+def _children_maxrss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _measure_child(pipeline, sample, conn):
+    pipeline(sample)
+    conn.send(_children_maxrss_kb())
+    conn.close()
+
+
+def ocr_maxrss_kb(pipeline, sample) -> Optional[int]:
+    """Peak RSS of the OCR subprocesses (tesseract) for one image, None where unmeasurable.
+
+    tracemalloc only sees the Python heap, and RUSAGE_CHILDREN is a high-water mark over
+    every child so far, so the image is run once more in a forked process whose own
+    children are just this image's tesseract runs."""
+    if resource is None or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    ctx = multiprocessing.get_context("fork")
+    recv, send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_measure_child, args=(pipeline, sample, send))
+    proc.start()
+    send.close()
+    try:
+        return recv.recv()
+    except EOFError:
+        return None   # the child failed; its traceback is already on stderr
+    finally:
+        proc.join()
+
+
+def tesseract_version() -> Optional[str]:
+    try:
+        out = subprocess.run(["tesseract", "--version"], capture_output=True, text=True, timeout=10)
+        return (out.stdout or out.stderr).splitlines()[0]
+    except (OSError, IndexError, subprocess.SubprocessError):
+        return None
+
+
+def run(samples: List[dict], pipeline, repeat: int) -> List[dict]:
+    results = []
+    for s in samples:
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            items = pipeline(s)
+            times.append((time.perf_counter() - t0) * 1000)
+        # separate traced pass so tracemalloc overhead doesn't skew the timings
+        tracemalloc.start()
+        pipeline(s)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rec = {"label": s["label"], "latency_ms": round(median(times), 2), "py_peak_kb": round(peak / 1024, 1),
+               "ocr_maxrss_kb": ocr_maxrss_kb(pipeline, s),
+               "items": [{f: it.get(f, "") for f in FIELDS} for it in items]}
+        if s["expected"] is not None:
+            rec["fields"] = score(items, s["expected"])
+        results.append(rec)
+    return results
+
+
+def summarize(results: List[dict]) -> dict:
+    scored = [r for r in results if "fields" in r]
+    fields = {}
+    for f in FIELDS:
+        tp, n_pred, n_exp = (sum(r["fields"][f][i] for r in scored) for i in range(3))
+        fields[f] = prf(tp, n_pred, n_exp)
+    lat = sorted(r["latency_ms"] for r in results)
+    return {
+        "images": len(results), "scored_images": len(scored),
+        "fields": fields,
+        "macro_f1": round(sum(v["f1"] for v in fields.values()) / len(FIELDS), 4),
+        "latency_ms": {"median": round(median(lat), 2) if lat else None,
+                       "p95": lat[max(0, int(len(lat) * 0.95) - 1)] if lat else None,
+                       "total": round(sum(lat), 2)},
+        "images_per_s": round(len(lat) / (sum(lat) / 1000), 2) if lat and sum(lat) else None,
+        "py_peak_kb": max((r["py_peak_kb"] for r in results), default=0),
+        "ocr_maxrss_kb": max((r["ocr_maxrss_kb"] for r in results if r["ocr_maxrss_kb"] is not None), default=None),
+    }
+
+
+def compare(summary: dict, baseline: dict, max_f1_drop: float, max_slowdown: float) -> List[str]:
+    """Reasons to reject this run against the baseline summary (empty list = accept)."""
+    problems = []
+    for f in FIELDS:
+        old, new = baseline["fields"][f]["f1"], summary["fields"][f]["f1"]
+        if old - new > max_f1_drop:
+            problems.append(f"{f} F1 {old:.3f} -> {new:.3f}")
+    old_lat, new_lat = baseline["latency_ms"]["median"], summary["latency_ms"]["median"]
+    # ignore sub-millisecond noise (the text pipeline runs in microseconds)
+    if old_lat and new_lat and new_lat > old_lat * (1 + max_slowdown) and new_lat - old_lat > 1.0:
+        problems.append(f"median latency {old_lat:.0f} ms -> {new_lat:.0f} ms")
+    return problems
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="OCR + parser accuracy / throughput harness")
+    ap.add_argument("--pipeline", choices=["full", "layout", "text"], default="full")
+    ap.add_argument("--tess-config", default="", help='extra tesseract flags for the full pipeline, e.g. "--oem 1 --psm 6"')
+    ap.add_argument("--images", action="append", default=[], help="extra image folder (repeatable)")
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per image (median is kept)")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--max-f1-drop", type=float, default=0.0, help="allowed per-field F1 drop vs baseline")
+    ap.add_argument("--max-slowdown", type=float, default=0.10, help="allowed median latency growth vs baseline")
+    args = ap.parse_args()
+
+    samples = load_samples(args.images)
+    if args.pipeline == "text":
+        samples = [s for s in samples if s["text"] is not None]   # parser-only needs ground-truth text
+    if not samples:
+        sys.exit(f"no samples: {DATASET_ZIP} not found and no --images given")
+    results = run(samples, make_pipeline(args.pipeline, args.tess_config), max(1, args.repeat))
+    summary = summarize(results)
+
+    def kb(v):
+        return "n/a" if v is None else f"{v:.0f}"
+
+    # py heap: tracemalloc peak in this process; ocr RSS: peak of the tesseract processes
+    print(f"{'image':40s} {'ms':>8} {'py heap KB':>10} {'ocr RSS KB':>10} {'items':>5}")
+    for r in results:
+        print(f"{r['label'][:40]:40s} {r['latency_ms']:>8.1f} {kb(r['py_peak_kb']):>10} "
+              f"{kb(r['ocr_maxrss_kb']):>10} {len(r['items']):>5d}")
+    print(f"\n{'field':10s} {'precision':>9} {'recall':>7} {'f1':>6}")
+    for f, v in summary["fields"].items():
+        print(f"{f:10s} {v['precision']:>9.2%} {v['recall']:>7.2%} {v['f1']:>6.3f}")
+    lat = summary["latency_ms"]
+    print(f"\nmacro F1 {summary['macro_f1']:.3f} | median {lat['median']} ms, p95 {lat['p95']} ms, "
+          f"{summary['images_per_s']} img/s | py heap peak {kb(summary['py_peak_kb'])} KB, "
+          f"ocr RSS peak {kb(summary['ocr_maxrss_kb'])} KB")
+
+    report = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {"pipeline": args.pipeline, "tess_config": args.tess_config, "repeat": args.repeat,
+                   "images": args.images, "tesseract": tesseract_version() if args.pipeline != "text" else None,
+                   "python": platform.python_version()},
+        "summary": summary,
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        problems = compare(summary, base["summary"], args.max_f1_drop, args.max_slowdown)
+        if problems:
+            print("❌ Rejected vs baseline: " + "; ".join(problems))
+            sys.exit(1)
+        print(f"✅ Accepted vs baseline ({base['config']['pipeline']}, {base['run_at']})")
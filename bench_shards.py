@@ -0,0 +1,73 @@
+# bench_shards.py
+# Concurrent write throughput vs. shard count.
+#
+#   python bench_shards.py --shards 1 2 4 8 --threads 8 --writes 300
+#
+# Each writer thread inserts dose logs for random users, one commit per write
+# (the same pattern as POST /logs). --hold-ms keeps each write transaction open a
+# little longer, standing in for request work and fsync on real disks. With one
+# shard every commit queues on the same database lock; with N shards writers for
+# different users proceed in parallel.
+import argparse, random, shutil, tempfile, threading, time
+from contextlib import closing
+from shard_store import ShardRouter
+
+
+def run(shard_count: int, threads: int, writes: int, users: int, hold_ms: float) -> float:
+    tmp = tempfile.mkdtemp(prefix="hc_bench_")
+    try:
+        router = ShardRouter(shard_count, tmp, "bench")
+        router.init_shards()
+        for _ in range(users):
+            uid = router.next_user_id()
+            with closing(router.conn_for_user(uid)) as conn:
+                conn.execute("INSERT INTO users (id, name) VALUES (?,?)", (uid, f"user{uid}"))
+                conn.commit()
+
+        start = threading.Barrier(threads + 1)
+
+        def writer(seed):
+            rnd = random.Random(seed)
+            # one connection per (thread, shard), as the backend would hold per request
+            conns = {}
+            start.wait()
+            for _ in range(writes):
+                uid = rnd.randint(1, users)
+                k = router.shard_for_user(uid)
+                conn = conns.get(k) or conns.setdefault(k, router.connect(k))
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO logs (user_id, med_id, status, note) VALUES (?,?,?,?)",
+                             (uid, 1, "Taken", "bench"))
+                if hold_ms:
+                    time.sleep(hold_ms / 1000)
+                conn.commit()
+            for conn in conns.values():
+                conn.close()
+
+        ts = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+        for t in ts:
+            t.start()
+        start.wait()
+        t0 = time.perf_counter()
+        for t in ts:
+            t.join()
+        return threads * writes / (time.perf_counter() - t0)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sharded SQLite write-throughput benchmark")
+    ap.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--writes", type=int, default=300, help="commits per thread")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--hold-ms", type=float, default=1.0, help="time each write transaction stays open")
+    args = ap.parse_args()
+
+    base = None
+    print(f"{'shards':>6} {'writes/s':>10} {'speedup':>8}")
+    for n in args.shards:
+        wps = run(n, args.threads, args.writes, args.users, args.hold_ms)
+        base = base or wps
+        print(f"{n:>6} {wps:>10.0f} {wps / base:>7.2f}x")
@@ -0,0 +1,170 @@
+# chat_backend.py
+# Chat backend for the assistant tab:
+#   - OpenAIChat streams tokens from any OpenAI-compatible /chat/completions endpoint
+#     (the real API, or fake_llm_server.py for offline testing)
+#   - ChatSession keeps the prompt inside a token budget: recent turns verbatim,
+#     older turns folded into a running summary
+#   - ResponseCache answers repeated standalone questions without a model call
+#     (only answers generated without any conversation context are stored)
+import json, os, re, threading, time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+SYSTEM_PROMPT = "You are a friendly diabetes care assistant. Answer clearly and provide reliable medical links where possible."
+
+
+# ---------------- Model client ----------------
+class OpenAIChat:
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo",
+                 base_url: str = "https://api.openai.com/v1", timeout: float = 60):
+        self.api_key = api_key
+        self.model = model
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls) -> Optional["OpenAIChat"]:
+        key = os.getenv("OPENAI_API_KEY")
+        if not key:
+            return None
+        return cls(key, os.getenv("CHAT_MODEL", "gpt-3.5-turbo"),
+                   os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"))
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Yield content deltas as they arrive (server-sent events)."""
+        resp = requests.post(self.url, json={"model": self.model, "messages": messages, "stream": True},
+                             headers={"Authorization": f"Bearer {self.api_key}"},
+                             stream=True, timeout=self.timeout)
+        resp.raise_for_status()
+        with resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def complete(self, messages: List[Dict[str, str]]) -> str:
+        return "".join(self.stream(messages))
+
+
+# ---------------- Response cache ----------------
+_PUNCT = re.compile(r"[^\w\s]")
+# follow-ups that lean on earlier turns can't be answered from the cache
+_CONTEXTUAL = {"it", "its", "that", "this", "those", "these", "they", "them", "above", "previous", "again"}
+
+
+def normalize_question(q: str) -> str:
+    return " ".join(_PUNCT.sub(" ", q.lower()).split())
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl_s: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cacheable(key: str) -> bool:
+        return bool(key) and not (_CONTEXTUAL & set(key.split()))
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit and time.monotonic() - hit[0] < self.ttl_s:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            if hit:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str):
+        key = normalize_question(question)
+        if not self.cacheable(key) or not answer:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), answer)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)   # evict least recently used
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# ---------------- History window ----------------
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting
+    return len(text) // 4 + 4
+
+
+class ChatSession:
+    def __init__(self, model: OpenAIChat, cache: Optional[ResponseCache] = None,
+                 history_budget: int = 1500, system_prompt: str = SYSTEM_PROMPT):
+        self.model = model
+        self.cache = cache
+        self.history_budget = history_budget
+        self.system_prompt = system_prompt
+        self.summary = ""       # running summary of turns that fell out of the window
+        self.summarized = 0     # number of history entries folded into the summary
+
+    def _fold_old_turns(self, history: List[Tuple[str, str]]):
+        """Summarize the oldest turns until the rest fit in the token budget."""
+        keep_from = self.summarized
+        used = sum(estimate_tokens(m) for _, m in history[keep_from:])
+        while used > self.history_budget and keep_from < len(history) - 1:
+            used -= estimate_tokens(history[keep_from][1])
+            keep_from += 1
+        if keep_from == self.summarized:
+            return
+        dropped = "\n".join(f"{'User' if r == 'user' else 'Assistant'}: {m}"
+                            for r, m in history[self.summarized:keep_from])
+        prompt = [{"role": "system", "content": "Summarize this diabetes-care conversation in under 80 words. "
+                                                "Keep medicines, doses, readings and open questions."},
+                  {"role": "user", "content": (f"Earlier summary: {self.summary}\n\n" if self.summary else "") + dropped}]
+        try:
+            self.summary = self.model.complete(prompt).strip()
+        except Exception:
+            # model unavailable: keep a truncated transcript rather than losing context entirely
+            self.summary = (self.summary + "\n" + dropped)[-2 * self.history_budget:]
+        self.summarized = keep_from
+
+    def build_messages(self, history: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        self._fold_old_turns(history)
+        system = self.system_prompt
+        if self.summary:
+            system += f"\n\nConversation so far (summary): {self.summary}"
+        messages = [{"role": "system", "content": system}]
+        for role, msg in history[self.summarized:]:
+            messages.append({"role": "user" if role == "user" else "assistant", "content": msg})
+        return messages
+
+    def stream_answer(self, history: List[Tuple[str, str]]) -> Iterator[str]:
+        """Stream the reply to the last user turn in `history`."""
+        question = history[-1][1]
+        if self.cache is not None:
+            cached = self.cache.get(question)
+            if cached is not None:
+                yield cached
+                return
+        # the cache is shared across sessions (and patients): only store answers that came
+        # from the question alone, never ones shaped by this conversation's turns or summary
+        standalone = len(history) == 1 and not self.summary
+        parts = []
+        for delta in self.model.stream(self.build_messages(history)):
+            parts.append(delta)
+            yield delta
+        if self.cache is not None and standalone:
+            self.cache.put(question, "".join(parts))
@@ -2,6 +2,7 @@ import re
 import sqlite3
 import schedule
 import time
+from rx_parser import frequency_to_times
 
 # -------------------------
 # Step 1: Prescription Text (replace later with OCR output)
@@ -22,12 +23,7 @@ matches = re.findall(pattern, prescription_text)
 # -------------------------
 # Step 3: Frequency → Reminder Times Mapping
 # -------------------------
-frequency_to_times = {
-    "Once a day": ["08:00"],
-    "Twice daily": ["08:00", "20:00"],
-    "Thrice daily": ["08:00", "14:00", "20:00"],
-    "Every night at bedtime": ["22:00"]
-}
+# frequency_to_times is shared with the app and OCR tools (rx_parser.py)
 
 # -------------------------
 # Step 4: Setup SQLite Database (Recreate Table Fresh)
@@ -0,0 +1,105 @@
+# dose_index.py
+# Per-user sorted dose-time index for "next dose" questions.
+# Each user's reminder times are parsed once into a sorted minute-of-day array
+# and only rebuilt after that user's meds change (invalidate()). Lookups are a
+# binary search and wrap around midnight into the following day(s).
+# Only users with at least one valid time are kept, least recently used first out
+# past max_users, so lookups for unknown ids don't grow the index.
+import re, threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+
+
+_HHMM = re.compile(r"([0-9]{1,2}):([0-5][0-9])")
+
+
+def parse_hhmm(t: str) -> Optional[int]:
+    """'08:30' or '8:30' -> 510 (minute of day); None for blanks or malformed values.
+    Same rule as the dose_schedule triggers, so both agree on which times exist."""
+    match = _HHMM.fullmatch(t.strip(' "\t\r\n')) if isinstance(t, str) else None
+    if match is None or int(match[1]) >= 24:
+        return None
+    return int(match[1]) * 60 + int(match[2])
+
+
+def build_entries(meds: Iterable[Tuple[str, str]]) -> Tuple[array, List[str]]:
+    """(name, times_csv) rows -> (sorted minutes, med names in the same order)."""
+    pairs = []
+    for name, times_csv in meds:
+        for t in (times_csv or "").split(","):
+            minute = parse_hhmm(t)
+            if minute is not None:
+                pairs.append((minute, name))
+    pairs.sort()
+    return array("H", [p[0] for p in pairs]), [p[1] for p in pairs]
+
+
+class DoseIndex:
+    def __init__(self, loader: Callable[[int], List[Tuple[str, str]]], max_users: int = 10000):
+        # loader(user_id) -> [(med name, reminder_times csv), ...]
+        self._loader = loader
+        self.max_users = max_users
+        self._by_user: "OrderedDict[int, Tuple[array, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._gen = 0   # bumped on invalidation so a rebuild racing a write isn't stored
+
+    def invalidate(self, user_id: Optional[int]):
+        if user_id is None:
+            return
+        with self._lock:
+            self._gen += 1
+            self._by_user.pop(user_id, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._gen += 1
+            self._by_user.clear()
+
+    def _entries(self, user_id: int) -> Tuple[array, List[str]]:
+        with self._lock:
+            hit, gen = self._by_user.get(user_id), self._gen
+            if hit is not None:
+                self._by_user.move_to_end(user_id)
+        if hit is None:
+            hit = build_entries(self._loader(user_id))
+            # unknown ids and users without meds aren't cached: they'd pile up for good
+            with self._lock:
+                if gen == self._gen and hit[0]:
+                    self._by_user[user_id] = hit
+                    while len(self._by_user) > self.max_users:
+                        self._by_user.popitem(last=False)
+        return hit
+
+    def next_doses(self, user_id: int, n: int = 3, now: Optional[datetime] = None) -> List[dict]:
+        """Next n doses at or after `now`, rolling over into tomorrow (and beyond) as needed."""
+        minutes, names = self._entries(user_id)
+        if not minutes or n <= 0:
+            return []
+        now = now or datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = bisect_left(minutes, now.hour * 60 + now.minute)
+        out = []
+        for j in range(start, start + n):
+            day, i = divmod(j, len(minutes))
+            at = midnight + timedelta(days=day, minutes=minutes[i])
+            out.append({
+                "name": names[i],
+                "time": f"{minutes[i] // 60:02d}:{minutes[i] % 60:02d}",
+                "day_offset": day,
+                "at": at.isoformat(timespec="minutes"),
+            })
+        return out
+
+
+def format_next_doses(doses: List[dict]) -> str:
+    if not doses:
+        return "No medicines saved yet."
+    labels = {0: "", 1: " (tomorrow)"}
+    lines = [f"{d['name']} at {d['time']}{labels.get(d['day_offset'], ' (in %d days)' % d['day_offset'])}"
+             for d in doses]
+    return "Next doses:\n- " + "\n- ".join(lines)
@@ -0,0 +1,109 @@
+# dose_schedule.py
+# Normalized dose schedule: one row per (med, minute of day), derived from
+# meds.reminder_times ("08:00,20:00") and indexed on minute_of_day, so "which
+# doses are due in the next N minutes, across all patients" is a range scan.
+#
+# Triggers on meds keep the table in sync for every writer (backend, Streamlit
+# app, grid editor, split tool) without each call site having to remember it.
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from dose_index import MINUTES_PER_DAY
+
+
+def _schedule_select(med: str, csv_expr: str) -> str:
+    # SELECT (med_id, user_id, minute_of_day) for each valid "HH:MM" item of the CSV;
+    # `med` is the row alias (NEW in triggers, meds in the backfill).
+    # json_quote escapes quotes, backslashes and control characters, and a comma is
+    # never part of an escape, so splitting the quoted string on commas is always
+    # valid JSON whatever was typed. Items must be H:MM or HH:MM (the same rule as
+    # dose_index.parse_hhmm); anything else is skipped.
+    items = f"""json_each('[' || replace(json_quote(COALESCE({csv_expr}, '')), ',', '","') || ']')"""
+    src = f"{items} AS t" if med == "NEW" else f"meds, {items} AS t"
+    v = """trim(t.value, ' "' || char(9, 10, 13))"""
+    return f"""SELECT med_id, user_id, m FROM (
+            SELECT {med}.id AS med_id, {med}.user_id AS user_id,
+                   CAST(substr({v}, 1, instr({v}, ':') - 1) AS INTEGER) * 60
+                   + CAST(substr({v}, instr({v}, ':') + 1) AS INTEGER) AS m
+            FROM {src}
+            WHERE {v} GLOB '[0-9]:[0-5][0-9]' OR {v} GLOB '[0-2][0-9]:[0-5][0-9]')
+        WHERE m BETWEEN 0 AND {MINUTES_PER_DAY - 1}"""
+
+
+_FILL_NEW = f"""
+        DELETE FROM dose_schedule WHERE med_id = NEW.id;
+        INSERT OR IGNORE INTO dose_schedule (med_id, user_id, minute_of_day)
+            {_schedule_select('NEW', 'NEW.reminder_times')};"""
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS dose_schedule (
+        med_id INTEGER NOT NULL,
+        user_id INTEGER,
+        minute_of_day INTEGER NOT NULL,
+        PRIMARY KEY (med_id, minute_of_day)) WITHOUT ROWID""",
+    # covering index: the due-now scan never touches the table itself
+    "CREATE INDEX IF NOT EXISTS idx_dose_schedule_minute ON dose_schedule (minute_of_day, user_id, med_id)",
+    # triggers are dropped and recreated so existing databases pick up fixes to them
+    "DROP TRIGGER IF EXISTS meds_dose_ins",
+    f"CREATE TRIGGER meds_dose_ins AFTER INSERT ON meds BEGIN{_FILL_NEW}\n    END",
+    "DROP TRIGGER IF EXISTS meds_dose_upd",
+    f"CREATE TRIGGER meds_dose_upd AFTER UPDATE OF reminder_times, user_id ON meds BEGIN{_FILL_NEW}\n    END",
+    "DROP TRIGGER IF EXISTS meds_dose_del",
+    """CREATE TRIGGER meds_dose_del AFTER DELETE ON meds BEGIN
+        DELETE FROM dose_schedule WHERE med_id = OLD.id;
+    END""",
+]
+
+BACKFILL = f"""INSERT OR IGNORE INTO dose_schedule (med_id, user_id, minute_of_day)
+    {_schedule_select('meds', 'meds.reminder_times')}"""
+
+
+def ensure_dose_schedule(conn: sqlite3.Connection):
+    """Create the table and index, (re)create the triggers; backfill from meds the first
+    time, and rebuild when the trigger definition changed (older rules kept other rows)."""
+    def trigger_sql():
+        return conn.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='meds_dose_ins'").fetchone()
+
+    created = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='dose_schedule'").fetchone() is None
+    before = trigger_sql()
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+    if created or trigger_sql() != before:
+        conn.execute("DELETE FROM dose_schedule")
+        conn.execute(BACKFILL)
+    conn.commit()
+
+
+def due_ranges(now: datetime, window_min: int) -> List[Tuple[int, int, int]]:
+    """(first minute, last minute, day offset) ranges covering [now, now + window), split at midnight."""
+    start = now.hour * 60 + now.minute
+    window_min = max(1, min(window_min, MINUTES_PER_DAY))
+    end = start + window_min - 1
+    if end < MINUTES_PER_DAY:
+        return [(start, end, 0)]
+    return [(start, MINUTES_PER_DAY - 1, 0), (0, end - MINUTES_PER_DAY, 1)]
+
+
+def due_doses(conn: sqlite3.Connection, window_min: int = 5, now: Optional[datetime] = None,
+              user_id: Optional[int] = None) -> List[dict]:
+    """Doses scheduled in the next window_min minutes (now's minute included), soonest first;
+    every patient's, or only user_id's."""
+    now = now or datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    mine = "" if user_id is None else " AND d.user_id = ?"
+    out = []
+    for lo, hi, day in due_ranges(now, window_min):
+        args = (lo, hi) if user_id is None else (lo, hi, user_id)
+        rows = conn.execute(
+            f"""SELECT d.minute_of_day, d.user_id, d.med_id, m.name, m.strength
+               FROM dose_schedule d JOIN meds m ON m.id = d.med_id
+               WHERE d.minute_of_day BETWEEN ? AND ?{mine}
+               ORDER BY d.minute_of_day, d.user_id""", args).fetchall()
+        for minute, uid, med_id, name, strength in rows:
+            out.append({
+                "user_id": uid, "med_id": med_id, "name": name, "strength": strength,
+                "time": f"{minute // 60:02d}:{minute % 60:02d}",
+                "at": (midnight + timedelta(days=day, minutes=minute)).isoformat(timespec="minutes"),
+            })
+    return out
@@ -0,0 +1,127 @@
+# export_columnar.py
+# Columnar bulk export of patient history (users, meds, logs, vitals) to Arrow IPC
+# or Parquet. Rows are pulled from SQLite cursors with fetchmany() and converted
+# one record batch at a time, so memory stays flat regardless of history size.
+#
+#   python export_columnar.py --db med_dict.db --out export/ --user 3 --user 7 --format parquet
+#   python export_columnar.py --db med_dict.db --out export/          # whole cohort
+import argparse, io, os, sqlite3
+from contextlib import closing
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_OK = True
+except Exception:
+    PARQUET_OK = False
+
+BATCH_ROWS = 8192
+
+# columns exported per table; dictionary-encoded strings keep repetitive values small
+_DICT_STR = pa.dictionary(pa.int32(), pa.string())
+TABLES: Dict[str, pa.Schema] = {
+    "users": pa.schema([("id", pa.int64()), ("name", pa.string()), ("age", pa.int32()),
+                        ("diabetes_type", _DICT_STR), ("height_cm", pa.float64()),
+                        ("weight_kg", pa.float64()), ("contact", pa.string())]),
+    "meds": pa.schema([("id", pa.int64()), ("user_id", pa.int64()), ("form", _DICT_STR),
+                       ("name", _DICT_STR), ("strength", _DICT_STR), ("frequency", _DICT_STR),
+                       ("reminder_times", _DICT_STR)]),
+    "logs": pa.schema([("id", pa.int64()), ("user_id", pa.int64()), ("med_id", pa.int64()),
+                       ("status", _DICT_STR), ("note", _DICT_STR), ("ts", pa.timestamp("s"))]),
+    "vitals": pa.schema([("id", pa.int64()), ("user_id", pa.int64()), ("kind", _DICT_STR),
+                         ("value", pa.float64()), ("ts", pa.timestamp("s"))]),
+}
+# Arrow output uses the IPC *stream* format (.arrows): unlike the file format it allows
+# each batch to carry its own dictionary, so batches never need to be held back and unified
+FORMATS = {"arrow": ".arrows", "parquet": ".parquet"}
+
+
+def _column(values: tuple, field: pa.Field) -> pa.Array:
+    if pa.types.is_timestamp(field.type):
+        # SQLite CURRENT_TIMESTAMP text ("YYYY-MM-DD HH:MM:SS") -> timestamp[s]
+        return pa.array(values, pa.string()).cast(field.type)
+    if pa.types.is_dictionary(field.type):
+        return pa.array(values, pa.string()).dictionary_encode().cast(field.type)
+    return pa.array(values, field.type)
+
+
+def iter_record_batches(conn: sqlite3.Connection, table: str, user_ids: Optional[List[int]] = None,
+                        batch_rows: int = BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    schema = TABLES[table]
+    key = "id" if table == "users" else "user_id"
+    sql = f"SELECT {', '.join(schema.names)} FROM {table}"
+    params: tuple = ()
+    if user_ids:
+        sql += f" WHERE {key} IN ({','.join('?' * len(user_ids))})"
+        params = tuple(user_ids)
+    with closing(conn.cursor()) as c:
+        c.execute(sql, params)
+        while True:
+            rows = c.fetchmany(batch_rows)
+            if not rows:
+                break
+            cols = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays([_column(v, f) for v, f in zip(cols, schema)], schema=schema)
+
+
+def write_table(conns: Iterable[sqlite3.Connection], table: str, path: str,
+                fmt: str = "arrow", user_ids: Optional[List[int]] = None) -> int:
+    """Stream one table from every source connection into a single file; returns row count."""
+    schema, rows = TABLES[table], 0
+    if fmt == "parquet":
+        if not PARQUET_OK:
+            raise RuntimeError("Parquet export needs pyarrow built with parquet support")
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    elif fmt == "arrow":
+        writer = pa.ipc.new_stream(path, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    else:
+        raise ValueError(f"unknown format {fmt!r}")
+    with writer:
+        for conn in conns:
+            for batch in iter_record_batches(conn, table, user_ids):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    return rows
+
+
+def export_history(conns: List[sqlite3.Connection], out_dir: str, user_ids: Optional[List[int]] = None,
+                   fmt: str = "arrow") -> Dict[str, int]:
+    os.makedirs(out_dir, exist_ok=True)
+    return {t: write_table(conns, t, os.path.join(out_dir, t + FORMATS[fmt]), fmt, user_ids) for t in TABLES}
+
+
+def arrow_stream_chunks(conns: List[sqlite3.Connection], table: str,
+                        user_ids: Optional[List[int]] = None) -> Iterator[bytes]:
+    """Arrow IPC stream bytes, yielded batch by batch (for HTTP streaming responses)."""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, TABLES[table]) as writer:
+        for conn in conns:
+            for batch in iter_record_batches(conn, table, user_ids):
+                writer.write_batch(batch)
+                yield sink.getvalue()
+                sink.seek(0)
+                sink.truncate()
+    yield sink.getvalue()   # end-of-stream marker
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Export patient history to Arrow IPC / Parquet")
+    ap.add_argument("--db", default="med_dict.db", help="SQLite file (ignored when HC_SHARDS is set)")
+    ap.add_argument("--out", required=True, help="output directory")
+    ap.add_argument("--user", type=int, action="append", help="user id (repeat for a cohort; default all)")
+    ap.add_argument("--format", choices=sorted(FORMATS), default="arrow")
+    args = ap.parse_args()
+
+    from shard_store import ShardRouter
+    router = ShardRouter.from_env(args.db)
+    conns = router.all_conns() if router else [sqlite3.connect(args.db)]
+    try:
+        counts = export_history(conns, args.out, args.user, args.format)
+    finally:
+        for conn in conns:
+            conn.close()
+    for t, n in counts.items():
+        path = os.path.join(args.out, t + FORMATS[args.format])
+        print(f"{t:8s} {n:8d} rows  {os.path.getsize(path):>10,d} bytes  {path}")
@@ -0,0 +1,84 @@
+# fake_llm_server.py
+# Minimal OpenAI-compatible /v1/chat/completions server for offline testing.
+# Replies are canned and streamed word by word with configurable latency.
+#
+#   python fake_llm_server.py --port 8100 --first-token-ms 300 --token-ms 20
+#   OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8100/v1 streamlit run streamlit_app.py
+import argparse, json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED = [
+    ("metformin", "Metformin lowers blood sugar by reducing glucose production in the liver. "
+                  "Take it with meals to limit stomach upset. More: https://medlineplus.gov/druginfo/meds/a682611.html"),
+    ("insulin", "Insulin helps glucose move from the blood into your cells. Rotate injection sites and "
+                "never skip a dose without asking your doctor. More: https://www.diabetes.org/healthy-living/medication-treatments/insulin-other-injectables"),
+    ("summarize", "Patient discussed medicines and recent readings; no open questions."),
+]
+DEFAULT = ("Keep your blood sugar in the range your doctor set, take medicines on time and log your readings. "
+           "More: https://www.nhs.uk/conditions/diabetes/")
+
+
+def reply_for(messages) -> str:
+    text = " ".join(m.get("content", "") for m in messages[-2:]).lower()
+    return next((ans for key, ans in CANNED if key in text), DEFAULT)
+
+
+def make_handler(first_token_s: float, token_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            Handler.calls += 1
+            answer = reply_for(body.get("messages", []))
+            time.sleep(first_token_s)
+            if not body.get("stream"):
+                time.sleep(token_s * len(answer.split()))
+                out = json.dumps({"choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i, word in enumerate(answer.split(" ")):
+                chunk = {"choices": [{"index": 0, "delta": {"content": (" " if i else "") + word}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(token_s)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def start(port: int = 0, first_token_ms: float = 300, token_ms: float = 20):
+    """Start in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(first_token_ms / 1000, token_ms / 1000))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fake OpenAI-compatible chat server")
+    ap.add_argument("--port", type=int, default=8100)
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--token-ms", type=float, default=20)
+    args = ap.parse_args()
+    server, url = start(args.port, args.first_token_ms, args.token_ms)
+    print(f"✅ Fake chat model at {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,149 @@
+# layout_ocr.py
+# Layout-aware OCR: read only the medication rows of a prescription.
+#   1. layout pass: word boxes from a downscaled grayscale page (image_to_data)
+#   2. find the medication region: the span of lines that look like med rows
+#   3. OCR each line strip of that region at full resolution, in parallel (--psm 7)
+#   4. lines below the confidence threshold get a slower, cleaned-up second pass
+# Per-line confidence is carried through to parse_prescription_lines().
+import os, shlex, subprocess, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+import pytesseract
+from PIL import Image, ImageOps
+
+from rx_parser import RX_HINT, parse_prescription_lines
+
+LAYOUT_MAX_WIDTH = 1000     # layout pass only needs boxes, not accurate text
+LOW_CONF = 70.0             # lines under this confidence get the second pass
+STRIP_PAD = 6               # pixels of margin around each line strip (full resolution)
+# one tesseract process per strip, single-threaded each, so strips don't oversubscribe the CPU
+WORKERS = max(1, min(8, os.cpu_count() or 1))
+STRIP_ENV = {"OMP_THREAD_LIMIT": "1"}   # applied to the strip tesseract processes only
+
+
+class OcrLine(NamedTuple):
+    text: str
+    conf: float                          # mean word confidence, 0-100
+    box: Tuple[int, int, int, int]       # left, top, right, bottom in page pixels
+
+
+def group_lines(data: Dict[str, list], scale: float = 1.0) -> List[OcrLine]:
+    """image_to_data DICT output -> text lines (top to bottom), boxes rescaled by 1/scale."""
+    lines: Dict[tuple, list] = {}
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if not word.strip() or conf < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(i)
+    out = []
+    for idx in lines.values():
+        left = min(data["left"][i] for i in idx)
+        top = min(data["top"][i] for i in idx)
+        right = max(data["left"][i] + data["width"][i] for i in idx)
+        bottom = max(data["top"][i] + data["height"][i] for i in idx)
+        out.append(OcrLine(" ".join(data["text"][i] for i in idx),
+                           sum(float(data["conf"][i]) for i in idx) / len(idx),
+                           tuple(int(round(v / scale)) for v in (left, top, right, bottom))))
+    out.sort(key=lambda l: (l.box[1], l.box[0]))
+    return out
+
+
+def medication_region(lines: List[OcrLine]) -> List[OcrLine]:
+    """Lines from the first to the last med-looking line (letterhead, signature, stamps dropped)."""
+    hits = [i for i, l in enumerate(lines) if RX_HINT.search(l.text)]
+    if not hits:
+        return []
+    return lines[hits[0]:hits[-1] + 1]
+
+
+def layout_lines(img: Image.Image) -> List[OcrLine]:
+    gray = ImageOps.grayscale(img)
+    scale = min(1.0, LAYOUT_MAX_WIDTH / gray.width)
+    if scale < 1.0:
+        gray = gray.resize((int(gray.width * scale), int(gray.height * scale)), Image.BILINEAR)
+    data = pytesseract.image_to_data(gray, config="--psm 3", output_type=pytesseract.Output.DICT)
+    return group_lines(data, scale)
+
+
+def _strip(img: Image.Image, box) -> Image.Image:
+    l, t, r, b = box
+    # full page width: the layout pass may have clipped the ends of a row
+    return img.crop((0, max(0, t - STRIP_PAD), img.width, min(img.height, b + STRIP_PAD)))
+
+
+def _strip_tsv(strip: Image.Image, config: str) -> List[Tuple[str, float]]:
+    """(word, conf) pairs from one tesseract run on a strip, under STRIP_ENV.
+    pytesseract always passes the process environment, so the strip runs call
+    tesseract themselves rather than changing os.environ for every caller."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "strip.png")
+        strip.save(path)
+        proc = subprocess.run([pytesseract.pytesseract.tesseract_cmd, path, "stdout", *shlex.split(config), "tsv"],
+                              capture_output=True, env={**os.environ, **STRIP_ENV})
+    if proc.returncode:
+        raise pytesseract.TesseractError(proc.returncode, proc.stderr.decode(errors="replace").strip())
+    rows = proc.stdout.decode(errors="replace").splitlines()
+    if not rows:
+        return []
+    header = rows[0].split("\t")
+    i_text, i_conf = header.index("text"), header.index("conf")
+    out = []
+    for row in rows[1:]:
+        cols = row.split("\t")
+        if len(cols) == len(header):
+            out.append((cols[i_text], float(cols[i_conf])))
+    return out
+
+
+def _ocr_strip(strip: Image.Image, config: str) -> Tuple[str, float]:
+    words = [(w, c) for w, c in _strip_tsv(strip, config) if w.strip() and c >= 0]
+    if not words:
+        return "", 0.0
+    return " ".join(w for w, _ in words), sum(c for _, c in words) / len(words)
+
+
+def _fast_pass(strip: Image.Image) -> Tuple[str, float]:
+    return _ocr_strip(strip, "--psm 7")
+
+
+def _careful_pass(strip: Image.Image) -> Tuple[str, float]:
+    # upscale + autocontrast + binarize, LSTM engine only
+    g = ImageOps.autocontrast(ImageOps.grayscale(strip))
+    g = g.resize((g.width * 2, g.height * 2), Image.LANCZOS)
+    g = g.point(lambda p: 255 if p > 150 else 0)
+    return _ocr_strip(g, "--oem 1 --psm 7")
+
+
+def _map(fn, items):
+    if len(items) <= 1 or WORKERS == 1:
+        return [fn(x) for x in items]
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        return list(pool.map(fn, items))
+
+
+def ocr_medication_lines(img: Image.Image, low_conf: float = LOW_CONF) -> List[OcrLine]:
+    """OCR only the medication region; falls back to the layout pass text if no region is found."""
+    img = img.convert("RGB")
+    lines = layout_lines(img)
+    region = medication_region(lines)
+    if not region:
+        return lines
+    strips = [_strip(img, l.box) for l in region]
+    first = _map(_fast_pass, strips)
+    retry = [i for i, (_, conf) in enumerate(first) if conf < low_conf]
+    second = dict(zip(retry, _map(_careful_pass, [strips[i] for i in retry])))
+    out = []
+    for i, (l, (text, conf)) in enumerate(zip(region, first)):
+        if i in second and second[i][1] > conf:
+            text, conf = second[i]
+        out.append(OcrLine(text, conf, l.box))
+    return out
+
+
+def ocr_prescription(file_or_img, low_conf: float = LOW_CONF) -> Tuple[str, List[dict]]:
+    """Layout-aware replacement for ocr_any + parse_prescription_text: (region text, parsed items)."""
+    img = file_or_img if isinstance(file_or_img, Image.Image) else Image.open(file_or_img)
+    lines = ocr_medication_lines(img, low_conf)
+    return "\n".join(l.text for l in lines), parse_prescription_lines((l.text, l.conf) for l in lines)
@@ -0,0 +1,152 @@
+# med_catalogue.py
+# In-memory drug catalogue with prefix (typeahead) search.
+# The medicines table is loaded once into an immutable snapshot: a tuple of
+# Drug records plus a sorted array of normalized keys (generic name, brand names
+# and every word of them) with a parallel array of record indices. A search is
+# one bisect plus a short scan. CatalogueStore swaps in a fresh snapshot when the
+# catalogue file changes on disk, without a restart.
+import hashlib, os, re, sqlite3, threading, time
+from array import array
+from bisect import bisect_left
+from contextlib import closing
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class Drug(NamedTuple):
+    form: str
+    name: str
+    strength: str
+    brands: Tuple[str, ...]
+
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_ALNUM.sub(" ", (text or "").lower()).split())
+
+
+class Catalogue:
+    __slots__ = ("drugs", "keys", "targets", "names", "last_words", "loaded_at")
+
+    def __init__(self, drugs: List[Drug]):
+        pairs = set()
+        for i, d in enumerate(drugs):
+            for label in (d.name,) + d.brands:
+                full = normalize(label)
+                if not full:
+                    continue
+                pairs.add((full, i))
+                # every word suffix too, so "glar" finds "Insulin Glargine"
+                words = full.split()
+                for w in range(1, len(words)):
+                    pairs.add((" ".join(words[w:]), i))
+        ordered = sorted(pairs)
+        self.drugs: Tuple[Drug, ...] = tuple(drugs)
+        self.keys: Tuple[str, ...] = tuple(k for k, _ in ordered)
+        self.targets = array("I", [i for _, i in ordered])
+        # normalized generic name and its last word, for ranking; "" when nothing
+        # survives normalization (e.g. a name only in non-Latin script)
+        self.names: Tuple[str, ...] = tuple(normalize(d.name) for d in drugs)
+        self.last_words: Tuple[str, ...] = tuple(n.rsplit(" ", 1)[-1] for n in self.names)
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.drugs)
+
+    def search(self, q: str, limit: int = 10) -> List[Tuple[Drug, str]]:
+        """(drug, matched label) for entries whose name, brand or a word in them starts with q."""
+        nq = normalize(q)
+        if not nq:
+            return []
+        hits = {}
+        i = bisect_left(self.keys, nq)
+        while i < len(self.keys) and self.keys[i].startswith(nq):
+            d = self.targets[i]
+            if d not in hits:
+                hits[d] = self.keys[i]
+            i += 1
+        drugs, names, last = self.drugs, self.names, self.last_words
+        # generic-name matches first, then brands; shorter names first within each
+        ranked = sorted(hits, key=lambda d: (not names[d].startswith(nq), not last[d].startswith(nq),
+                                             len(drugs[d].name), drugs[d].name))
+        return [(drugs[d], _label(drugs[d], hits[d])) for d in ranked[:limit]]
+
+
+def _label(d: Drug, key: str) -> str:
+    # report which name matched: a brand ("Lantus") or the generic name
+    for b in d.brands:
+        if normalize(b).endswith(key):
+            return b
+    return d.name
+
+
+def catalogue_fingerprint(db_path: str) -> Optional[str]:
+    # the catalogue often shares its file with busy tables (users, logs), so an mtime
+    # change alone doesn't mean the medicines changed; hash the rows themselves so an
+    # edit that keeps every length (e.g. "10 mg" -> "20 mg") is still seen
+    with closing(sqlite3.connect(db_path)) as conn:
+        if not conn.execute("PRAGMA table_info(medicines)").fetchall():
+            return None
+        h = hashlib.sha1()
+        for row in conn.execute("SELECT * FROM medicines ORDER BY id"):
+            h.update(repr(row).encode())
+        return h.hexdigest()
+
+
+def load_catalogue(db_path: str) -> Catalogue:
+    with closing(sqlite3.connect(db_path)) as conn:
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(medicines)")}
+        if not cols:
+            return Catalogue([])   # no catalogue yet (run med_dict_setup.py)
+        brand_col = "brands" if "brands" in cols else "''"
+        rows = conn.execute(f"SELECT form, name, strength, {brand_col} FROM medicines").fetchall()
+    return Catalogue([Drug(f or "", n or "", s or "", tuple(b.strip() for b in (br or "").split(",") if b.strip()))
+                      for f, n, s, br in rows if n])
+
+
+class CatalogueStore:
+    def __init__(self, db_path: str, check_every_s: float = 5.0):
+        self.db_path = db_path
+        self.check_every_s = check_every_s
+        self._lock = threading.Lock()
+        self._mtime = self._stat()
+        self._checked = time.monotonic()
+        self._fingerprint = catalogue_fingerprint(db_path)
+        self.current = load_catalogue(db_path)
+
+    def _stat(self) -> Optional[float]:
+        # in WAL mode a commit only touches the -wal file until the next checkpoint
+        mtimes = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError:
+                pass
+        return max(mtimes) if mtimes else None
+
+    def get(self) -> Catalogue:
+        """Current snapshot; reloads (at most every check_every_s) if the file changed."""
+        now = time.monotonic()
+        if now - self._checked >= self.check_every_s and self._lock.acquire(blocking=False):
+            try:
+                self._checked = now
+                mtime = self._stat()
+                if mtime != self._mtime:
+                    self._mtime = mtime
+                    fp = catalogue_fingerprint(self.db_path)
+                    if fp != self._fingerprint:
+                        self.current = load_catalogue(self.db_path)
+                        self._fingerprint = fp
+            except sqlite3.Error:
+                pass   # mid-write or broken file: keep serving the previous snapshot
+            finally:
+                self._lock.release()
+        return self.current
+
+    def reload(self) -> Catalogue:
+        with self._lock:
+            self.current = load_catalogue(self.db_path)
+            self._fingerprint = catalogue_fingerprint(self.db_path)
+            self._mtime, self._checked = self._stat(), time.monotonic()
+        return self.current
@@ -10,20 +10,22 @@ CREATE TABLE medicines (
     id INTEGER PRIMARY KEY,
     form TEXT,
     name TEXT,
-    strength TEXT
+    strength TEXT,
+    brands TEXT
 )
 """)
 
-# Common diabetes medicines
+# Common diabetes medicines (brands: comma-separated brand names for typeahead search)
 meds = [
-    ("Tab.", "Metformin", "500mg"),
-    ("Tab.", "Glimepiride", "2mg"),
-    ("Tab.", "Pioglitazone", "15mg"),
-    ("Inj.", "Insulin Glargine", "20 units"),
-    ("Inj.", "Insulin Lispro", "10 units"),
+    ("Tab.", "Metformin", "500mg", "Glucophage,Glycomet"),
+    ("Tab.", "Glimepiride", "2mg", "Amaryl"),
+    ("Tab.", "Pioglitazone", "15mg", "Actos,Pioz"),
+    ("Inj.", "Insulin Glargine", "20 units", "Lantus,Basaglar,Toujeo"),
+    ("Inj.", "Insulin Lispro", "10 units", "Humalog,Admelog"),
+    ("Tab.", "Telmisartan", "40mg", "Micardis,Telma"),
 ]
 
-c.executemany("INSERT INTO medicines (form, name, strength) VALUES (?,?,?)", meds)
+c.executemany("INSERT INTO medicines (form, name, strength, brands) VALUES (?,?,?,?)", meds)
 
 conn.commit()
 conn.close()
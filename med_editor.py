@@ -0,0 +1,93 @@
+# med_editor.py
+# Batched medicine edits for the Streamlit grid: diff the edited grid against the
+# snapshot the user started from, then apply every insert/update/delete in one
+# transaction. Updates and deletes are compare-and-swap on the snapshot values,
+# so if another session changed or removed a row meanwhile nothing is written.
+import sqlite3
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+MED_COLUMNS = ["form", "name", "strength", "frequency", "reminder_times"]
+
+
+class MedConflict(Exception):
+    """A row changed in the database since the grid snapshot was taken."""
+
+
+class MedChanges(NamedTuple):
+    inserts: List[Dict[str, str]]
+    updates: List[Tuple[int, Dict[str, Optional[str]], Dict[str, str]]]   # (id, original, new)
+    deletes: List[Tuple[int, Dict[str, Optional[str]]]]                   # (id, original)
+
+    def __bool__(self):
+        return bool(self.inserts or self.updates or self.deletes)
+
+
+def _raw(v) -> Optional[str]:
+    return None if v is None or (not isinstance(v, str) and pd.isna(v)) else v
+
+
+def _clean(v) -> str:
+    v = _raw(v)
+    return "" if v is None else str(v).strip()
+
+
+def diff_meds(base: pd.DataFrame, edited: pd.DataFrame,
+              times_for: Optional[Callable[[str], str]] = None) -> MedChanges:
+    """Compare the grid (rows without an id are new) with its starting snapshot.
+
+    times_for(frequency) fills reminder_times for new rows left blank, and for
+    rows whose frequency changed while their times were left alone.
+    """
+    originals = {int(r["id"]): {c: _raw(r[c]) for c in MED_COLUMNS} for _, r in base.iterrows()}
+    inserts, updates, seen = [], [], set()
+    for _, r in edited.iterrows():
+        new = {c: _clean(r.get(c)) for c in MED_COLUMNS}
+        rid = r.get("id")
+        if _raw(rid) is None:
+            if not new["name"]:
+                continue   # blank row added by the grid and never filled in
+            if not new["reminder_times"] and times_for:
+                new["reminder_times"] = times_for(new["frequency"])
+            inserts.append(new)
+            continue
+        mid = int(rid)
+        seen.add(mid)
+        orig = originals.get(mid)
+        if orig is None:
+            continue
+        if times_for and new["frequency"] != _clean(orig["frequency"]) \
+                and new["reminder_times"] == _clean(orig["reminder_times"]):
+            new["reminder_times"] = times_for(new["frequency"])
+        if any(new[c] != _clean(orig[c]) for c in MED_COLUMNS):
+            updates.append((mid, orig, new))
+    deletes = [(mid, orig) for mid, orig in originals.items() if mid not in seen]
+    return MedChanges(inserts, updates, deletes)
+
+
+def apply_med_changes(conn: sqlite3.Connection, user_id: int, changes: MedChanges):
+    """Apply all changes atomically; raises MedConflict (and writes nothing) on a stale row."""
+    match = " AND ".join(f"{c} IS ?" for c in MED_COLUMNS)
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        for mid, orig, new in changes.updates:
+            c.execute(f"UPDATE meds SET {', '.join(f'{k}=?' for k in MED_COLUMNS)} "
+                      f"WHERE id=? AND user_id=? AND {match}",
+                      [new[k] for k in MED_COLUMNS] + [mid, user_id] + [orig[k] for k in MED_COLUMNS])
+            if c.rowcount != 1:
+                raise MedConflict(f"'{orig['name']}' was changed or removed in another session")
+        for mid, orig in changes.deletes:
+            c.execute(f"DELETE FROM meds WHERE id=? AND user_id=? AND {match}",
+                      [mid, user_id] + [orig[k] for k in MED_COLUMNS])
+            if c.rowcount != 1:
+                raise MedConflict(f"'{orig['name']}' was changed or removed in another session")
+        c.executemany(f"INSERT INTO meds (user_id, {', '.join(MED_COLUMNS)}) VALUES (?,?,?,?,?,?)",
+                      [[user_id] + [m[k] for k in MED_COLUMNS] for m in changes.inserts])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
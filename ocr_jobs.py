@@ -0,0 +1,227 @@
+# ocr_jobs.py
+# Bounded OCR job queue for the backend.
+# Uploads become jobs; at most `workers` run at once in a process pool (one OCR
+# per process, so a big scan never stalls a request thread and concurrent uploads
+# can't oversubscribe the CPU). Up to `max_queued` more wait in a FIFO; beyond that
+# submit() raises QueueFull and the API answers 503 + Retry-After.
+# Queued jobs nobody has polled for `stale_s` are cancelled before they start;
+# finished jobs are forgotten after `keep_s`.
+import asyncio, io, multiprocessing, os, threading, time, uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, Optional
+
+MODES = ("layout", "full")
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+# ---------- worker process side ----------
+def _init_worker(strip_threads: int):
+    # the pool already runs `workers` pages side by side; keep each page's strip OCR narrow
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    import layout_ocr
+    layout_ocr.WORKERS = strip_threads
+
+
+class OcrError(Exception):
+    pass
+
+
+def run_ocr(image_bytes: bytes, mode: str) -> dict:
+    try:
+        from PIL import Image
+        img = Image.open(io.BytesIO(image_bytes))
+        if mode == "layout":
+            from layout_ocr import ocr_prescription
+            text, items = ocr_prescription(img)
+        else:
+            import pytesseract
+            from rx_parser import parse_prescription_text
+            text = pytesseract.image_to_string(img)
+            items = parse_prescription_text(text)
+    except Exception as e:
+        # some library exceptions (pytesseract's) can't be unpickled in the parent,
+        # which would surface as a broken pool; send a plain message back instead
+        raise OcrError(f"{type(e).__name__}: {e}") from None
+    return {"text": text, "items": items}
+
+
+# ---------- backend side ----------
+class QueueFull(Exception):
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"OCR queue full, retry in {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class OcrJob:
+    __slots__ = ("id", "mode", "image", "status", "created", "started", "finished",
+                 "last_seen", "result", "error", "done", "waiters")
+
+    def __init__(self, image: bytes, mode: str):
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.image: Optional[bytes] = image
+        self.status = QUEUED
+        self.created = self.last_seen = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+        self.waiters = []   # (event loop, future) of async long-polls, woken on finish
+
+
+class OcrJobQueue:
+    def __init__(self, workers: int = 2, max_queued: int = 8, stale_s: float = 120, keep_s: float = 600):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.stale_s = stale_s
+        self.keep_s = keep_s
+        self._lock = threading.RLock()   # a done-callback may fire inside submit()
+        self._jobs: Dict[str, OcrJob] = {}
+        self._queue: Deque[OcrJob] = deque()
+        self._running = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._avg_s = 5.0   # moving average of job time, for Retry-After and ETA hints
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: the backend is multi-threaded, and forking a threaded process is unsafe
+            strip_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(strip_threads,))
+        return self._pool
+
+    def submit(self, image: bytes, mode: str = "layout") -> OcrJob:
+        with self._lock:
+            self._sweep()
+            if len(self._queue) >= self.max_queued:
+                waves = (len(self._queue) + self._running) / self.workers
+                raise QueueFull(max(1, round(waves * self._avg_s)))
+            job = OcrJob(image, mode)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._dispatch()
+        return job
+
+    def _dispatch(self):
+        # caller holds the lock
+        while self._queue and self._running < self.workers:
+            job = self._queue[0]
+            if time.time() - job.last_seen > self.stale_s:
+                # went stale while waiting for a slot: don't spend a worker on it
+                self._cancel(job, "nobody polled this job; cancelled before it started")
+                continue
+            self._queue.popleft()
+            job.status, job.started = RUNNING, time.time()
+            image, job.image = job.image, None
+            self._running += 1
+            pool = None
+            try:
+                pool = self._ensure_pool()
+                fut = pool.submit(run_ocr, image, job.mode)
+            except Exception as e:
+                # broken or shut-down pool, spawn failure...: fail the job and free its slot
+                self._finish(job, None, pool, e)
+                continue
+            fut.add_done_callback(lambda f, job=job, pool=pool: self._finish(job, f, pool))
+
+    def _finish(self, job: OcrJob, fut, pool: Optional[ProcessPoolExecutor], error: Optional[Exception] = None):
+        with self._lock:
+            self._running -= 1
+            job.finished = time.time()
+            try:
+                if error is not None:
+                    raise error
+                job.result, job.status = fut.result(), DONE
+                self._avg_s = 0.8 * self._avg_s + 0.2 * (job.finished - job.started)
+            except Exception as e:
+                job.error = str(e) if isinstance(e, OcrError) else f"{type(e).__name__}: {e}"
+                job.status = FAILED
+                if isinstance(e, BrokenProcessPool) and pool is not None and self._pool is pool:
+                    # a worker died (e.g. out of memory); start a fresh pool for the next jobs
+                    pool.shutdown(wait=False)
+                    self._pool = None
+            self._wake(job)
+            self._dispatch()
+
+    def _sweep(self):
+        # caller holds the lock
+        now = time.time()
+        for job in [j for j in self._queue if now - j.last_seen > self.stale_s]:
+            self._cancel(job, "nobody polled this job; cancelled before it started")
+        for jid in [j.id for j in self._jobs.values() if j.status in FINISHED and now - j.finished > self.keep_s]:
+            del self._jobs[jid]
+
+    def _cancel(self, job: OcrJob, reason: str):
+        self._queue.remove(job)
+        job.status, job.error, job.image = CANCELLED, reason, None
+        job.finished = time.time()
+        self._wake(job)
+
+    @staticmethod
+    def _wake(job: OcrJob):
+        # caller holds the lock; runs on pool callback threads, so hand over to each loop
+        job.done.set()
+        for loop, fut in job.waiters:
+            try:
+                loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+            except RuntimeError:
+                pass   # that loop is already closed
+        job.waiters.clear()
+
+    def cancel(self, job_id: str) -> Optional[OcrJob]:
+        """Cancel a queued job; running jobs finish (a process can't be interrupted mid-OCR)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == QUEUED:
+                self._cancel(job, "cancelled by client")
+            return job
+
+    def get(self, job_id: str) -> Optional[OcrJob]:
+        """Look up a job, marking it as still wanted; see wait() for long-polling."""
+        with self._lock:
+            self._sweep()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.last_seen = time.time()
+            return job
+
+    async def wait(self, job: OcrJob, timeout_s: float):
+        """Await the job finishing, at most timeout_s, without holding a thread."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            if job.status in FINISHED:
+                return
+            job.waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout_s)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if (loop, fut) in job.waiters:
+                    job.waiters.remove((loop, fut))
+
+    def status(self, job: OcrJob) -> dict:
+        with self._lock:
+            out = {"job_id": job.id, "status": job.status, "mode": job.mode,
+                   "created": job.created, "started": job.started, "finished": job.finished}
+            if job.status == QUEUED:
+                pos = next(i for i, j in enumerate(self._queue) if j is job)
+                out["queue_position"] = pos + 1
+                out["eta_s"] = round((pos // self.workers + 1) * self._avg_s, 1)
+            if job.status == DONE:
+                out["result"] = job.result
+            if job.error:
+                out["error"] = job.error
+            return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "running": self._running, "queued": len(self._queue),
+                    "max_queued": self.max_queued, "avg_job_s": round(self._avg_s, 2)}
@@ -0,0 +1,58 @@
+# rx_parser.py
+# Prescription text -> medicine rows. Shared by the Streamlit app and the OCR tools.
+import re
+from typing import Iterable, List, Optional, Tuple
+
+frequency_to_times = {
+    "Once a day": ["08:00"],
+    "Twice daily": ["08:00","20:00"],
+    "Thrice daily": ["08:00","14:00","20:00"],
+    "Every night at bedtime": ["22:00"]
+}
+
+# Updated pattern to include Tab., Cap., Inj., Syrup, Drops, etc.
+RX_PATTERN = re.compile(
+    r"(Tab\.|Caps\.|Inj\.|Syrup|Drops|mj\.)\s*"          # Form
+    r"([A-Za-z0-9\s]+?)"                                  # Name (non-greedy)
+    r"(?:\s*([\d\.]+\s*(?:mg|ng|IU/ml|units?|ml))?)?"     # Strength (optional)
+    r".*?"                                                # Anything in between
+    r"(once daily|twice daily|thrice daily|every night at bedtime|at bedtime|before breakfast|after meals|after breakfast|after lunch|after dinner)",
+    flags=re.IGNORECASE
+)
+
+# cheap test for "this line is probably a medication row" (used to locate the table)
+RX_HINT = re.compile(
+    r"\b(tab|caps?|inj|mj|syrup|drops)\b\.?|\b(once|twice|thrice) daily\b|\bat bedtime\b|\b\d+\s*(mg|units?|iu/ml)\b",
+    flags=re.IGNORECASE
+)
+
+
+def parse_prescription_line(line: str) -> Optional[dict]:
+    m = RX_PATTERN.search(line)
+    if not m:
+        return None
+    form, name, strength, freq = m.groups()
+    norm = next((f for f in frequency_to_times if f.lower() in freq.lower()), "Once a day")
+    return {
+        "form": form,
+        "name": name.strip(),
+        "strength": strength.strip() if strength else "",
+        "frequency": norm,
+        "times_csv": ",".join(frequency_to_times[norm])
+    }
+
+
+def parse_prescription_text(text: str) -> List[dict]:
+    return [item for item in map(parse_prescription_line, text.splitlines()) if item]
+
+
+def parse_prescription_lines(lines: Iterable[Tuple[str, float]]) -> List[dict]:
+    """Like parse_prescription_text, for (line text, OCR confidence 0-100) pairs;
+    each item carries the confidence of the line it came from."""
+    items = []
+    for text, conf in lines:
+        item = parse_prescription_line(text)
+        if item:
+            item["confidence"] = conf
+            items.append(item)
+    return items
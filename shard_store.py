@@ -0,0 +1,197 @@
+# shard_store.py
+# Optional per-user sharded storage: users are hash-partitioned across N SQLite
+# files so writes for one patient never wait on another patient's lock.
+#
+#   HC_SHARDS=4 uvicorn all_in_one_diabetes_app:app        # enable, 4 shards
+#   python shard_store.py split med_dict.db --shards 4      # migrate a single-file DB
+import os, sqlite3, zlib, argparse
+from contextlib import closing
+from typing import List, Optional
+
+from dose_schedule import ensure_dose_schedule
+
+# Rows created in shard k get ids from (k+1)*ID_STRIDE upwards, so ids stay
+# globally unique and new ids tell us their shard without probing.
+# Rows migrated from a single-file DB keep their original (small) ids.
+ID_STRIDE = 1 << 40
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        name TEXT, age INTEGER, diabetes_type TEXT,
+        height_cm REAL, weight_kg REAL, contact TEXT)""",
+    """CREATE TABLE IF NOT EXISTS family (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER, name TEXT, relation TEXT, phone TEXT)""",
+    """CREATE TABLE IF NOT EXISTS meds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER, form TEXT, name TEXT,
+        strength TEXT, frequency TEXT, reminder_times TEXT)""",
+    """CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER, med_id INTEGER,
+        status TEXT, note TEXT,
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+    """CREATE TABLE IF NOT EXISTS vitals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER, kind TEXT, value REAL,
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+]
+ROW_TABLES = ["family", "meds", "logs", "vitals"]   # per-user tables (AUTOINCREMENT)
+USER_TABLES = ["users"] + ROW_TABLES
+
+
+class ShardRouter:
+    def __init__(self, shard_count: int, shard_dir: str, prefix: str = "shard"):
+        if shard_count < 1:
+            raise ValueError("shard_count must be >= 1")
+        self.shard_count = shard_count
+        self.shard_dir = shard_dir
+        self.prefix = prefix
+        os.makedirs(shard_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, db_path: str) -> Optional["ShardRouter"]:
+        """Router configured by HC_SHARDS / HC_SHARD_DIR, or None when sharding is off."""
+        n = int(os.getenv("HC_SHARDS", "0") or 0)
+        if n < 1:
+            return None
+        stem = os.path.splitext(os.path.basename(db_path))[0]
+        router = cls(n, os.getenv("HC_SHARD_DIR", f"{stem}_shards"))
+        router.init_shards()
+        return router
+
+    # ---------- paths / connections ----------
+    def shard_path(self, k: int) -> str:
+        return os.path.join(self.shard_dir, f"{self.prefix}_{k:03d}.db")
+
+    def seq_path(self) -> str:
+        return os.path.join(self.shard_dir, f"{self.prefix}_seq.db")
+
+    def connect(self, k: int) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.shard_path(k), check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def shard_for_user(self, user_id: int) -> int:
+        # crc32 rather than hash(): stable across processes and Python versions
+        return zlib.crc32(str(int(user_id)).encode()) % self.shard_count
+
+    def conn_for_user(self, user_id: int) -> sqlite3.Connection:
+        return self.connect(self.shard_for_user(user_id))
+
+    def all_conns(self) -> List[sqlite3.Connection]:
+        return [self.connect(k) for k in range(self.shard_count)]
+
+    def shard_for_row(self, table: str, row_id: int) -> Optional[int]:
+        if table not in USER_TABLES:
+            raise ValueError(f"unknown table {table!r}")
+        if table != "users" and row_id >= ID_STRIDE:
+            k = row_id // ID_STRIDE - 1
+            return k if k < self.shard_count else None
+        if table == "users":
+            return self.shard_for_user(row_id)
+        # migrated row: probe (reads only, never blocks writers under WAL)
+        for k in range(self.shard_count):
+            with closing(self.connect(k)) as conn:
+                if conn.execute(f"SELECT 1 FROM {table} WHERE id=?", (row_id,)).fetchone():
+                    return k
+        return None
+
+    def conn_for_row(self, table: str, row_id: int) -> sqlite3.Connection:
+        k = self.shard_for_row(table, row_id)
+        # unknown id: any shard will do, the caller's statement simply matches nothing
+        return self.connect(0 if k is None else k)
+
+    # ---------- ids ----------
+    def next_user_id(self) -> int:
+        # user ids come from one tiny counter file; user creation is rare so its lock is cheap
+        with closing(sqlite3.connect(self.seq_path(), timeout=30)) as conn:
+            cur = conn.execute("INSERT INTO user_ids DEFAULT VALUES")
+            conn.execute("DELETE FROM user_ids WHERE id < ?", (cur.lastrowid,))
+            conn.commit()
+            return cur.lastrowid
+
+    # ---------- schema ----------
+    def init_shards(self):
+        for k in range(self.shard_count):
+            with closing(self.connect(k)) as conn:
+                for ddl in SCHEMA:
+                    conn.execute(ddl)
+                ensure_dose_schedule(conn)
+                base = (k + 1) * ID_STRIDE
+                for t in ROW_TABLES:
+                    if not conn.execute("SELECT 1 FROM sqlite_sequence WHERE name=?", (t,)).fetchone():
+                        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?,?)", (t, base))
+                conn.commit()
+        with closing(sqlite3.connect(self.seq_path())) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS user_ids (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+            conn.commit()
+
+    def bump_user_seq(self, at_least: int):
+        with closing(sqlite3.connect(self.seq_path())) as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='user_ids'").fetchone()
+            if row is None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('user_ids', ?)", (at_least,))
+            elif row[0] < at_least:
+                conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name='user_ids'", (at_least,))
+            conn.commit()
+
+
+# ---------------- Split tool ----------------
+def split_database(src_path: str, router: ShardRouter, batch: int = 5000) -> dict:
+    """Copy every user and their family/meds/logs/vitals rows into the user's shard."""
+    router.init_shards()
+    counts = {t: 0 for t in USER_TABLES}
+    conns = router.all_conns()
+    try:
+        with closing(sqlite3.connect(src_path)) as src:
+            have = {r[0] for r in src.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for t in USER_TABLES:
+                if t not in have:
+                    continue
+                cols = [r[1] for r in src.execute(f"PRAGMA table_info({t})")]
+                key = cols.index("id" if t == "users" else "user_id")
+                sql = f"INSERT OR REPLACE INTO {t} ({','.join(cols)}) VALUES ({','.join('?' * len(cols))})"
+                cur = src.execute(f"SELECT {','.join(cols)} FROM {t}")
+                while True:
+                    rows = cur.fetchmany(batch)
+                    if not rows:
+                        break
+                    buckets = [[] for _ in conns]
+                    for r in rows:
+                        # rows with no owner (user_id NULL) have nowhere better to go than shard 0
+                        k = router.shard_for_user(r[key]) if r[key] is not None else 0
+                        buckets[k].append(r)
+                    for conn, b in zip(conns, buckets):
+                        if b:
+                            conn.executemany(sql, b)
+                    counts[t] += len(rows)
+            if "users" in have:
+                max_uid = src.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+                router.bump_user_seq(max_uid)
+        for conn in conns:
+            conn.commit()
+    finally:
+        for conn in conns:
+            conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sharded SQLite storage tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("split", help="split a single-file database into per-user shards")
+    sp.add_argument("src", help="source SQLite file, e.g. med_dict.db")
+    sp.add_argument("--shards", type=int, required=True)
+    sp.add_argument("--out-dir", help="defaults to <src stem>_shards")
+    args = ap.parse_args()
+
+    if args.cmd == "split":
+        stem = os.path.splitext(os.path.basename(args.src))[0]
+        router = ShardRouter(args.shards, args.out_dir or f"{stem}_shards")
+        counts = split_database(args.src, router)
+        for t, n in counts.items():
+            print(f"{t:8s} {n:8d} rows")
+        print(f"✅ Split {args.src} into {args.shards} shards under {router.shard_dir}")
@@ -0,0 +1,4 @@
+# The modules live at the repository root (flat scripts, no package).
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,27 @@
+import sqlite3
+from contextlib import closing
+
+from backup_store import BackupScheduler
+
+
+def test_scheduler_skips_unchanged_files(tmp_path):
+    db = str(tmp_path / "app.db")
+    with closing(sqlite3.connect(db)) as conn:
+        conn.execute("CREATE TABLE t (x)")
+        conn.commit()
+    sched = BackupScheduler(lambda: [db], str(tmp_path / "backups"), interval_s=60)
+    assert sched.run_once() is not None
+    assert sched.run_once() is None
+
+
+def test_scheduler_records_failures(tmp_path):
+    db = str(tmp_path / "app.db")
+    sqlite3.connect(db).close()
+    blocker = tmp_path / "backups"
+    blocker.write_text("a file where the backup folder should be")
+    sched = BackupScheduler(lambda: [db], str(blocker), interval_s=60)
+    sched.run_once()
+    sched.last_state = None
+    sched.run_once()
+    assert sched.failures == 2
+    assert sched.last_error.startswith("NotADirectoryError") and sched.last_error_at
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from dose_index import DoseIndex
+
+
+def test_unknown_and_empty_users_are_not_cached():
+    meds = {1: [("Metformin", "08:00,20:00")], 2: [("Aspirin", "")]}
+    index = DoseIndex(lambda uid: meds.get(uid, []))
+    for uid in (1, 2, 404):
+        index.next_doses(uid, now=datetime(2026, 1, 1, 7, 0))
+    assert list(index._by_user) == [1]
+
+
+def test_index_is_capped_least_recently_used_first():
+    index = DoseIndex(lambda uid: [("Metformin", "08:00")], max_users=2)
+    for uid in (1, 2, 1, 3):
+        index.next_doses(uid)
+    assert list(index._by_user) == [1, 3]
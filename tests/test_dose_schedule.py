@@ -0,0 +1,73 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from dose_index import parse_hhmm
+from dose_schedule import due_doses, ensure_dose_schedule
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""CREATE TABLE meds (id INTEGER PRIMARY KEY, user_id INTEGER, form TEXT, name TEXT,
+                    strength TEXT, frequency TEXT, reminder_times TEXT)""")
+    ensure_dose_schedule(conn)
+    yield conn
+    conn.close()
+
+
+def add_med(conn, user_id, name, times):
+    conn.execute("INSERT INTO meds (user_id, name, strength, reminder_times) VALUES (?, ?, '', ?)",
+                 (user_id, name, times))
+
+
+def scheduled(conn):
+    return [m for (m,) in conn.execute("SELECT minute_of_day FROM dose_schedule ORDER BY minute_of_day")]
+
+
+def test_due_window_across_midnight(conn):
+    add_med(conn, 1, "Insulin", "23:58")
+    add_med(conn, 2, "Metformin", "23:59,00:01")
+    add_med(conn, 1, "Aspirin", "00:02")
+    now = datetime(2026, 1, 1, 23, 57)
+    assert [(d["user_id"], d["time"]) for d in due_doses(conn, 5, now)] == \
+        [(1, "23:58"), (2, "23:59"), (2, "00:01")]
+    mine = due_doses(conn, 10, now, user_id=1)
+    assert [(d["name"], d["at"]) for d in mine] == [("Insulin", "2026-01-01T23:58"), ("Aspirin", "2026-01-02T00:02")]
+    assert len(due_doses(conn, 1440, now)) == 4
+
+
+@pytest.mark.parametrize("item", ["1abc:30", "9 am:15", "08:00:00", "7:5", "24:00", "123:00", "8:60",
+                                  "ab", ":30", "08:", "", "8:00pm", "a\\b", "0\t8:00"])
+def test_malformed_items_are_skipped(conn, item):
+    add_med(conn, 1, "X", f"{item},10:00")
+    assert scheduled(conn) == [600]
+    assert parse_hhmm(item) is None
+
+
+@pytest.mark.parametrize("item, minute", [("8:05", 485), ("08:05", 485), (" 23:59 ", 1439), ('"00:00"', 0),
+                                          ("\t12:30\n", 750)])
+def test_trigger_and_index_agree_on_valid_items(conn, item, minute):
+    add_med(conn, 1, "X", item)
+    assert scheduled(conn) == [minute]
+    assert parse_hhmm(item) == minute
+
+
+def test_update_and_delete_keep_schedule_in_sync(conn):
+    add_med(conn, 1, "X", "08:00")
+    conn.execute("UPDATE meds SET reminder_times = '09:00, 21:00' WHERE name = 'X'")
+    assert scheduled(conn) == [540, 1260]
+    conn.execute("DELETE FROM meds")
+    assert scheduled(conn) == []
+
+
+def test_changed_trigger_rebuilds_existing_rows(conn):
+    add_med(conn, 1, "X", "10:00")
+    conn.execute("INSERT INTO dose_schedule VALUES (1, 1, 90)")          # left by an older, looser rule
+    ensure_dose_schedule(conn)
+    assert scheduled(conn) == [90, 600]                                  # same triggers: untouched
+    conn.execute("DROP TRIGGER meds_dose_ins")
+    conn.execute("CREATE TRIGGER meds_dose_ins AFTER INSERT ON meds BEGIN SELECT 1; END")
+    ensure_dose_schedule(conn)
+    assert scheduled(conn) == [600]
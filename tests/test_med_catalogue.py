@@ -0,0 +1,16 @@
+from med_catalogue import Catalogue, Drug
+
+
+def test_search_ranks_generic_name_before_brand():
+    cat = Catalogue([Drug("Injection", "Insulin Glargine", "100 IU/ml", ("Lantus",)),
+                     Drug("Tablet", "Glimepiride", "2 mg", ("Amaryl",))])
+    assert [d.name for d, _ in cat.search("gl")] == ["Glimepiride", "Insulin Glargine"]
+    assert cat.search("lan")[0][1] == "Lantus"
+
+
+def test_search_survives_name_that_normalizes_to_nothing():
+    cat = Catalogue([Drug("Tablet", "メトホルミン", "500 mg", ("Glucophage",)),
+                     Drug("Tablet", "Glipizide", "5 mg", ())])
+    hits = cat.search("gl")
+    assert [d.strength for d, _ in hits] == ["5 mg", "500 mg"]
+    assert hits[1][1] == "Glucophage"
@@ -0,0 +1,64 @@
+import asyncio, time
+from concurrent.futures import Future
+
+from ocr_jobs import CANCELLED, DONE, FAILED, RUNNING, OcrJobQueue
+
+
+class FakePool:
+    """Hands out futures the test completes by hand."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, image, mode):
+        fut = Future()
+        self.futures.append(fut)
+        return fut
+
+
+class RefusingPool:
+    def submit(self, fn, image, mode):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+
+def queue(pool, **kw):
+    q = OcrJobQueue(workers=1, **kw)
+    q._ensure_pool = lambda: pool
+    return q
+
+
+def test_submit_failure_fails_job_and_frees_slot():
+    q = queue(RefusingPool())
+    job = q.submit(b"img", "full")
+    assert job.status == FAILED and "RuntimeError" in job.error
+    assert q.stats()["running"] == 0
+
+
+def test_stale_job_is_not_started():
+    pool = FakePool()
+    q = queue(pool, stale_s=0.05)
+    first, second = q.submit(b"a"), q.submit(b"b")
+    time.sleep(0.1)
+    pool.futures[0].set_result({"text": "", "items": []})
+    assert first.status == DONE and second.status == CANCELLED
+    assert len(pool.futures) == 1
+
+
+def test_async_wait_wakes_on_finish_and_times_out():
+    pool = FakePool()
+    q = queue(pool)
+    running, waiting = q.submit(b"a"), q.submit(b"b")
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, pool.futures[0].set_result, {"text": "", "items": []})
+        t0 = time.monotonic()
+        await q.wait(running, 5)
+        woke = time.monotonic() - t0
+        await q.wait(running, 5)     # already finished: returns at once
+        await q.wait(waiting, 0.05)  # started once the first finished, never completes: times out
+        return woke
+
+    assert asyncio.run(main()) < 1
+    assert running.status == DONE and not running.waiters
+    assert waiting.status == RUNNING and not waiting.waiters
@@ -0,0 +1,43 @@
+from versioned_cache import VersionedCache
+
+
+def test_versions_only_kept_for_cached_keys():
+    cache = VersionedCache(max_entries=10)
+    for uid in range(1000):
+        cache.get(("meds", uid), lambda: [])
+        cache.bump(("meds", uid + 5000))            # writes for users nobody has read
+    assert len(cache._entries) == 10
+    assert set(cache._versions) == set(cache._entries)
+    cache.bump(*cache._entries)
+    assert cache._versions == {} and cache._loading == {}
+
+
+def test_evicted_key_never_reuses_an_old_etag():
+    cache = VersionedCache(max_entries=1)
+    data = {"v": 1}
+    tag, _ = cache.get(("meds", 1), lambda: dict(data))
+    cache.get(("meds", 2), lambda: [])              # evicts ("meds", 1) and its version
+    data["v"] = 2
+    etag, body = cache.conditional(("meds", 1), lambda: dict(data), tag)
+    assert body is not None and etag != tag
+
+
+def test_bump_during_load_is_not_cached():
+    cache = VersionedCache()
+    key = ("users",)
+
+    def racing_load():
+        cache.bump(key)                             # a write lands while the list is being read
+        return ["stale"]
+
+    cache.get(key, racing_load)
+    assert key not in cache._entries and key not in cache._versions
+    _, body = cache.get(key, lambda: ["fresh"])
+    assert body == b'["fresh"]'
+
+
+def test_unchanged_body_keeps_its_etag_after_expiry():
+    cache = VersionedCache(ttl_s=0)
+    tag, _ = cache.get(("users",), lambda: [1])
+    etag, body = cache.conditional(("users",), lambda: [1], tag)
+    assert etag == tag and body is None
@@ -0,0 +1,134 @@
+# versioned_cache.py
+# Read-through cache for list endpoints, keyed by per-resource versions.
+# Writers bump() a resource key (("meds", user_id), ("users",), ...); readers get
+# the cached JSON body while its version is current, and an ETag derived from the
+# version so unchanged resources can be answered 304 without touching SQLite.
+#
+# Counters live in this process. Writes the backend doesn't see (another process,
+# a restored backup) are caught by revalidating entries older than ttl_s: the
+# resource is reloaded and keeps its version only if the body is unchanged.
+import json, threading, time, uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+Key = Tuple[Hashable, ...]
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+class VersionedCache:
+    def __init__(self, max_entries: int = 2048, ttl_s: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        # process epoch in every ETag: a restarted backend never 304s a tag it didn't issue
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        # versions come from one process-wide sequence, so a number is never reused for
+        # another body and a key's version can be forgotten along with its entry;
+        # _versions only holds keys that are cached or being loaded
+        self._seq = 0
+        self._versions: Dict[Key, int] = {}
+        self._loading: Dict[Key, int] = {}   # key -> loads in flight
+        self._entries: "OrderedDict[Key, Tuple[int, bytes, float]]" = OrderedDict()   # key -> (version, body, loaded_at)
+        self.hits = self.misses = self.not_modified = 0
+
+    def _next_version(self) -> int:
+        # caller holds the lock
+        self._seq += 1
+        return self._seq
+
+    def _forget(self, key: Key):
+        # caller holds the lock; a load in flight still needs the version to spot a racing bump
+        if key not in self._entries and key not in self._loading:
+            self._versions.pop(key, None)
+
+    def bump(self, *keys: Key):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                if key in self._loading:
+                    self._versions[key] = self._next_version()
+                else:
+                    self._versions.pop(key, None)
+
+    def clear(self):
+        """Forget every entry and version (e.g. after a restore); tags issued so far stop matching."""
+        with self._lock:
+            self.epoch = uuid.uuid4().hex[:8]
+            self._entries.clear()
+            self._versions = {k: self._next_version() for k in self._loading}
+
+    def _etag(self, version: int) -> str:
+        return f'"{self.epoch}-{version}"'
+
+    def fresh_etag(self, key: Key) -> Optional[str]:
+        """ETag of a current, unexpired cached body (no load); None when a load is needed."""
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit and hit[0] == self._versions.get(key) and time.monotonic() - hit[2] < self.ttl_s:
+                return self._etag(hit[0])
+        return None
+
+    def get(self, key: Key, loader: Callable[[], object]) -> Tuple[str, bytes]:
+        """(etag, JSON body) for key, calling loader() only when the cached body is stale."""
+        now = time.monotonic()
+        with self._lock:
+            v = self._versions.get(key)
+            hit = self._entries.get(key)
+            if hit and hit[0] == v and now - hit[2] < self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._etag(v), hit[1]
+            self.misses += 1
+            new = v is None
+            if new:
+                v = self._versions[key] = self._next_version()
+            self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            body = _encode(loader())   # outside the lock; a write racing this bumps v and orphans the load
+        finally:
+            with self._lock:
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+        with self._lock:
+            if self._versions.get(key) == v:
+                if not (new or (hit and hit[0] == v and hit[1] == body)):
+                    # fresh version unless this load just confirmed the cached body: covers
+                    # writes from another process after expiry
+                    v = self._versions[key] = self._next_version()
+                self._entries[key] = (v, body, now)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    old, _ = self._entries.popitem(last=False)
+                    self._forget(old)
+            else:
+                self._forget(key)
+            return self._etag(v), body
+
+    def conditional(self, key: Key, loader: Callable[[], object],
+                    if_none_match: Optional[str]) -> Tuple[str, Optional[bytes]]:
+        """(etag, body), or (etag, None) when the client's copy (If-None-Match) is current.
+        A current cached version answers without calling loader()."""
+        tag = self.fresh_etag(key)
+        if tag is None or not etag_matches(if_none_match, tag):
+            tag, body = self.get(key, loader)
+            if not etag_matches(if_none_match, tag):
+                return tag, body
+        with self._lock:
+            self.not_modified += 1
+        return tag, None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "not_modified": self.not_modified}